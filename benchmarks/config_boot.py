@@ -0,0 +1,151 @@
+"""Boot time and heap use of each way ConfigManager can hold the config: the
+config.json boots used to parse, the log with every leaf in it, and the log
+with "weights" packed into weights.bin (see PackedWeights). Each is written
+to a scratch directory first, then timed from loading it until the first
+config_read("weights") has looked up a plate, and the heap it holds is
+measured once it has loaded.
+
+Runs unchanged on the device, the MicroPython unix port and CPython, from
+the root of the checkout:
+
+    micropython benchmarks/config_boot.py
+    python3 benchmarks/config_boot.py
+
+Under CPython the simulator's uos, ujson and ubinascii stand in, time is
+host time and the heap is what tracemalloc counts, so only the ratios carry
+over to the device.
+"""
+
+import gc
+import sys
+import time
+
+MICROPYTHON = sys.implementation.name == "micropython"
+
+REPO_DIR = "/".join(sys.argv[0].split("/")[:-2]) or "."
+sys.path.append(REPO_DIR)
+if not MICROPYTHON:
+    sys.path.append(REPO_DIR + "/simulator")
+    import tracemalloc
+
+import ujson  # noqa: E402
+import uos  # noqa: E402
+from interfaces.default_config import DEFAULT_CONFIG  # noqa: E402
+from interfaces.hardware.hardware_config import ConfigManager  # noqa: E402
+
+SCRATCH_DIR = "config_boot.tmp"
+RUNS = 20
+
+
+def now_us():
+    if MICROPYTHON:
+        return time.ticks_us()
+    return time.perf_counter_ns() // 1000
+
+
+def elapsed_us(start):
+    if MICROPYTHON:
+        return time.ticks_diff(time.ticks_us(), start)
+    return time.perf_counter_ns() // 1000 - start
+
+
+def heap_used():
+    gc.collect()
+    if MICROPYTHON:
+        return gc.mem_alloc()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def mem_free():
+    gc.collect()
+    if MICROPYTHON:
+        return gc.mem_free()
+    return None
+
+
+# each returns what boot keeps, and what config_read("weights") gives
+def load_json():
+    with open("config.json") as f:
+        config = ujson.load(f)
+    return config, config["weights"]
+
+
+def load_log():
+    config_manager = ConfigManager("config.log")
+    return config_manager, config_manager.read("weights")
+
+
+def load_packed():
+    config_manager = ConfigManager("packed.log", packed_filename="weights.bin")
+    return config_manager, config_manager.read("weights")
+
+
+# name, what boot loads, the files it reads
+PATHS = (
+    ("json", load_json, ("config.json",)),
+    ("log", load_log, ("config.log",)),
+    ("packed", load_packed, ("packed.log", "weights.bin")),
+)
+
+
+def write_configs():
+    with open("config.json", "w") as f:
+        ujson.dump(DEFAULT_CONFIG, f)
+    # with nothing to load, both write the defaults out
+    ConfigManager("config.log")
+    ConfigManager("packed.log", packed_filename="weights.bin")
+
+
+def measure(load):
+    """Returns the fastest load to first lookup in us, the heap what boot
+    keeps holds in bytes, and gc.mem_free() with it loaded
+    """
+    best_us = None
+    for i in range(RUNS):
+        gc.collect()
+        start = now_us()
+        kept, weights = load()
+        weights["LB"]["plates"]["45"]["value"]
+        us = elapsed_us(start)
+        if best_us is None or us < best_us:
+            best_us = us
+        kept = weights = None
+
+    before = heap_used()
+    kept, weights = load()
+    weights = None
+    held = heap_used() - before
+    free = mem_free()
+    return best_us, held, free
+
+
+def main():
+    if not MICROPYTHON:
+        tracemalloc.start()
+    uos.mkdir(SCRATCH_DIR)
+    uos.chdir(SCRATCH_DIR)
+    try:
+        write_configs()
+        print(
+            "%-8s %10s %12s %12s %12s"
+            % ("config", "file bytes", "boot us", "heap bytes", "mem_free")
+        )
+        for name, load, filenames in PATHS:
+            size = 0
+            for filename in filenames:
+                size += uos.stat(filename)[6]
+            best_us, held, free = measure(load)
+            print(
+                "%-8s %10d %12d %12d %12s"
+                % (name, size, best_us, held, "-" if free is None else free)
+            )
+    finally:
+        for filename in uos.listdir():
+            uos.remove(filename)
+        uos.chdir("..")
+        uos.rmdir(SCRATCH_DIR)
+    print("(%s, boot is the best of %d runs)" % (sys.implementation.name, RUNS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""Keypress to screen latency for each state transition. Canonical key
+sessions are replayed on the simulator (see simulator/simulate.py), running
+the real states, Interface, GpioLcd and Keypad, and each key's latency is
+split three ways:
+calc: process_input, less the formatting helpers it calls
+format: render, plus the formatting helpers called from process_input
+bus: LCD bus time of the flush, from the simulator's virtual clock
+
+bus is exact, so any increase over the baseline fails. calc and format are
+host CPU time, scaled by a calibration loop so the baseline carries over
+between machines, and fail once they grow past --tolerance.
+
+    python3 benchmarks/latency.py             compare with the baseline
+    python3 benchmarks/latency.py --update    store a new baseline
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path[:0] = [os.path.join(REPO_DIR, "simulator"), REPO_DIR]
+
+import calculations  # noqa: E402
+import states  # noqa: E402
+from interfaces.interface import Key  # noqa: E402
+from simulate import Simulation, parse_key  # noqa: E402
+
+BASELINE_FILENAME = os.path.join(BENCHMARKS_DIR, "latency_baseline.json")
+
+
+def result_session(weights):
+    keys = ""
+    for weight in weights:
+        keys += " ".join(str(weight)) + " = 9 9 9 8 8 CLR "
+    return keys
+
+
+# each one starts and ends on an empty PromptState
+SESSIONS = (
+    ("digits", "1 3 5 CLR 2 2 5 CLR 4 0 5 CLR 9 9 CLR 1 0 0 CLR"),
+    ("results", result_session((45, 95, 135, 185, 225, 275, 315, 405, 495, 137))),
+    ("picture", "3 1 5 = % % % 9 CLR 4 0 5 = % CLR 1 3 5 = % 9 CLR"),
+    ("percent", "2 2 5 % 8 5 = = 9 CLR 3 1 5 % 7 0 = = CLR 4 0 5 % 5 = = CLR"),
+    ("units", "KG/LB 1 0 0 = 9 CLR KG/LB 1 4 0 = CLR KG/LB 6 0 = CLR KG/LB"),
+    ("menu", "SET 2 9 9 8 8 2 2 2 2 2 1 1 9 2 1 8 1"),
+    ("ladder", "2 2 5 % % 9 9 9 = 9 9 9 8 CLR 3 1 5 % % = CLR"),
+)
+
+# called from process_input, but only build strings
+FORMATTERS = (
+    (calculations, "format_hundredths_weight"),
+    (calculations, "get_plate_count_strings"),
+    (calculations, "get_plate_change_strings"),
+    (states.ScrollState, "add_strings"),
+    (states.ResultState, "make_rows"),
+)
+
+PERCENTILES = (50, 90, 99)
+
+
+class FormatTimer:
+    """Wraps the FORMATTERS to add up the time spent in them. Calls from
+    inside one of them only count once.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.total_ns = 0
+
+    def wrap(self, function):
+        def timed(*args, **kwargs):
+            if self.depth:
+                return function(*args, **kwargs)
+            self.depth += 1
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.total_ns += time.perf_counter_ns() - start
+                self.depth -= 1
+
+        return timed
+
+    def install(self):
+        for owner, name in FORMATTERS:
+            setattr(owner, name, self.wrap(getattr(owner, name)))
+
+
+def calibrate():
+    """Returns the ns a fixed mix of the work the states do takes here, the
+    best of a few runs
+    """
+    best = None
+    for i in range(5):
+        start = time.perf_counter_ns()
+        rows = []
+        for j in range(20000):
+            counts = [(j % 7, "45"), (j % 3, "25"), (1, "2.5")]
+            rows.append(" ".join(["%sx%d" % (label, n) for n, label in counts]))
+            if len(rows) > 8:
+                rows = rows[4:]
+        elapsed = time.perf_counter_ns() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def get_transition(before, key, after):
+    label = Key.LABELS.get(key & ~(Key.REPEAT | Key.LONG_PRESS), str(key))
+    if isinstance(before, states.PromptState) and Key.is_numeric(key):
+        label = "digit"
+    name = "%s %s" % (type(before).__name__, label)
+    if type(after) is not type(before):
+        name += " -> %s" % type(after).__name__
+    return name
+
+
+def replay(sim, timer, labels, samples):
+    """Presses each key, and adds a sample per key to samples, under the name
+    of its transition
+    """
+    for label in labels:
+        key = sim.read_key(parse_key(label))
+        gc.collect()
+
+        before = sim.state
+        timer.total_ns = 0
+        start = time.perf_counter_ns()
+        after = before.process_input(key)
+        calc_ns = time.perf_counter_ns() - start - timer.total_ns
+        format_ns = timer.total_ns
+        sim.state = after
+
+        bus_us = 0
+        bus_bytes = 0
+        if after.dirty:
+            start = time.perf_counter_ns()
+            after.render()
+            format_ns += time.perf_counter_ns() - start
+            bus_us, commands, data_writes, reads = sim.flush()
+            bus_bytes = commands + data_writes
+            after.dirty = False
+
+        name = get_transition(before, key, after)
+        samples.setdefault(name, []).append(
+            (calc_ns / 1000, format_ns / 1000, bus_us, bus_bytes)
+        )
+
+
+def percentile(values, p):
+    values = sorted(values)
+    rank = (p * len(values) + 99) // 100
+    return values[max(rank - 1, 0)]
+
+
+def summarize(samples):
+    """Returns transition -> stats, with the percentiles of each part"""
+    summary = {}
+    for name, rows in samples.items():
+        stats = {"n": len(rows)}
+        parts = {
+            "calc_us": [row[0] for row in rows],
+            "format_us": [row[1] for row in rows],
+            "bus_us": [row[2] for row in rows],
+            "bytes": [row[3] for row in rows],
+        }
+        parts["total_us"] = [row[0] + row[1] + row[2] for row in rows]
+        for part, values in parts.items():
+            for p in PERCENTILES:
+                stats["%s_p%d" % (part, p)] = round(percentile(values, p), 1)
+            stats["%s_max" % part] = round(max(values), 1)
+        summary[name] = stats
+    return summary
+
+
+def print_summary(summary):
+    print(
+        "%-40s %4s %10s %10s %10s | %9s %9s %9s %6s"
+        % (
+            "transition",
+            "n",
+            "total p50",
+            "total p90",
+            "total p99",
+            "calc p50",
+            "fmt p50",
+            "bus p50",
+            "bytes",
+        )
+    )
+    for name in sorted(summary):
+        stats = summary[name]
+        print(
+            "%-40s %4d %10.1f %10.1f %10.1f | %9.1f %9.1f %9d %6d"
+            % (
+                name,
+                stats["n"],
+                stats["total_us_p50"],
+                stats["total_us_p90"],
+                stats["total_us_p99"],
+                stats["calc_us_p50"],
+                stats["format_us_p50"],
+                stats["bus_us_p50"],
+                stats["bytes_max"],
+            )
+        )
+    print("(us; calc and format are host time, bus is the simulated LCD bus)")
+
+
+def compare(summary, baseline, scale, tolerance, slack_us):
+    """Returns a line for each regression against baseline"""
+    regressions = []
+    old_summary = baseline["transitions"]
+    for name in sorted(old_summary):
+        if name not in summary:
+            regressions.append("%s: no longer happens" % name)
+    for name in sorted(summary):
+        stats = summary[name]
+        if name not in old_summary:
+            regressions.append("%s: not in the baseline" % name)
+            continue
+        old = old_summary[name]
+        if stats["n"] != old["n"]:
+            regressions.append(
+                "%s: %d samples, the baseline has %d" % (name, stats["n"], old["n"])
+            )
+
+        # the simulated bus is deterministic, so any growth is real
+        for part in ("bus_us", "bytes"):
+            for stat in ["p%d" % p for p in PERCENTILES] + ["max"]:
+                key = "%s_%s" % (part, stat)
+                if stats[key] > old[key]:
+                    regressions.append(
+                        "%s: %s went from %s to %s" % (name, key, old[key], stats[key])
+                    )
+
+        for part in ("calc_us", "format_us"):
+            key = "%s_p50" % part
+            limit = old[key] * scale * tolerance + slack_us
+            if stats[key] > limit:
+                regressions.append(
+                    "%s: %s went from %.1f (%.1f here) to %.1f"
+                    % (name, key, old[key], old[key] * scale, stats[key])
+                )
+    return regressions
+
+
+def run_sessions():
+    sim = Simulation()
+    timer = FormatTimer()
+    timer.install()
+    # the first screen isn't down to any key
+    sim.state.render()
+    sim.flush()
+    sim.state.dirty = False
+
+    samples = {}
+    for session, keys in SESSIONS:
+        replay(sim, timer, keys.split(), samples)
+        if not isinstance(sim.state, states.PromptState) or sim.state.curr_val:
+            raise RuntimeError("session %s didn't end on an empty prompt" % session)
+    if sim.lcd.violations:
+        raise RuntimeError("LCD timing violations: %s" % sim.lcd.violations)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--update", action="store_true", help="store the results as the baseline"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.5,
+        help="how many times the baseline host time may grow (default 1.5)",
+    )
+    parser.add_argument(
+        "--slack-us",
+        type=float,
+        default=20,
+        help="host time growth always allowed, for timer noise (default 20)",
+    )
+    parser.add_argument("--baseline", default=BASELINE_FILENAME)
+    args = parser.parse_args()
+
+    calibration_ns = calibrate()
+    # the simulator writes its config files into the working directory
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            samples = run_sessions()
+        finally:
+            os.chdir(cwd)
+    summary = summarize(samples)
+    print_summary(summary)
+
+    if args.update:
+        with open(args.baseline, "w") as f:
+            json.dump(
+                {"calibration_ns": calibration_ns, "transitions": summary},
+                f,
+                indent=1,
+                sort_keys=True,
+            )
+            f.write("\n")
+        print("baseline written to %s" % args.baseline)
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except OSError:
+        print("no baseline at %s, run with --update" % args.baseline)
+        return 1
+
+    scale = calibration_ns / baseline["calibration_ns"]
+    regressions = compare(summary, baseline, scale, args.tolerance, args.slack_us)
+    print()
+    print("calibration: %.2fx the baseline machine" % scale)
+    if regressions:
+        print("REGRESSIONS against %s:" % args.baseline)
+        for regression in regressions:
+            print("  " + regression)
+        return 1
+    print("no regressions against %s" % args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
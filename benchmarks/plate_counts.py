@@ -0,0 +1,435 @@
+"""Exhaustive check and benchmark of calculations.get_plate_counts. Sweeps
+every subset of the plates in ConfigManager.DEFAULT_CONFIG, every bar and
+collar there, all of PromptState.UNIT_STATES, and every weight from 0 to 999
+at 1 to 100%. ResultState rounds weight * percent / 100 to a whole number
+before loading the bar, so those 100000 inputs come down to the 1000 weights
+0 to 999, and each is solved once per config.
+
+Each result is checked for:
+symmetric: both sides carry the same plates, within the pairs available,
+    and the total is the bar, two collars and twice one side
+displayed: the weight and plate strings ResultState shows add up to the total
+nearest: per side, no more than half the smallest plate from the target, so
+    the total is at most one smallest plate off (plus the odd 100th lost
+    splitting the target in two), once the target clears the bar and collars
+reference: the same total and number of plates as a plain table of every
+    per-side sum, built independently of PlateSolver
+table: PlateTable, which the states read, gives the same answer
+warm: solving again once the solver's table has grown gives the same answer
+
+The integer unit conversions are also checked against the float code they
+replaced, for every weight from 0 to 999 at 0 to 999%: the rounded
+percentage, kg_to_lb and lb_to_kg of every weight that gives, and the aux
+weight ResultState shows for every total up to there.
+
+    python3 benchmarks/plate_counts.py          everything, about 2 minutes
+    python3 benchmarks/plate_counts.py --quick  only the default plates
+"""
+
+import argparse
+import bisect
+import os
+import sys
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCHMARKS_DIR)]
+
+import calculations  # noqa: E402
+from interfaces.interface import Interface  # noqa: E402
+from interfaces.default_config import DEFAULT_CONFIG  # noqa: E402
+from interfaces.headless.headless_interface import (  # noqa: E402
+    HeadlessImplementation,
+    copy_config,
+)
+from states import PromptState  # noqa: E402
+
+NUM_WEIGHTS = 1000
+PERCENTS = range(1, 101)
+# failures printed per check
+MAX_EXAMPLES = 5
+
+# what kg_to_lb and lb_to_kg replaced
+KG_LB_COEFF = 2.20462
+CONVERSION_PERCENTS = range(1000)
+# kg weights where KG_LB_COEFF * kg is exactly half a 100th of a lb. The float
+# product rounded these up, kg_to_lb rounds them down
+KG_TO_LB_HALVES = (1250, 5250)
+
+
+def get_targets():
+    """Returns how many weight and percent pairs round to each weight"""
+    targets = [0] * NUM_WEIGHTS
+    for weight in range(NUM_WEIGHTS):
+        for percent in PERCENTS:
+            targets[calculations.round_div(weight * percent, 100)] += 1
+    return targets
+
+
+def check_conversions():
+    """Returns a failure for each place round_div, kg_to_lb or lb_to_kg
+    differ from the float expressions they replaced, less KG_TO_LB_HALVES
+    """
+    failures = []
+    weights = set()
+    for weight in range(NUM_WEIGHTS):
+        for percent in CONVERSION_PERCENTS:
+            rounded = calculations.round_div(weight * percent, 100)
+            if rounded != round(weight * percent / 100):
+                failures.append("%d at %d%% rounds to %d" % (weight, percent, rounded))
+            weights.add(rounded)
+
+    for weight in sorted(weights):
+        lb = calculations.kg_to_lb(weight * 100)
+        if lb != round(weight * 100 * KG_LB_COEFF) and weight not in KG_TO_LB_HALVES:
+            failures.append("kg_to_lb of %dkg is %d" % (weight, lb))
+        kg = calculations.lb_to_kg(weight * 100)
+        if kg != round(weight * 100 / KG_LB_COEFF):
+            failures.append("lb_to_kg of %dlb is %d" % (weight, kg))
+    for weight in KG_TO_LB_HALVES:
+        lb = calculations.kg_to_lb(weight * 100)
+        if lb != round(weight * 100 * KG_LB_COEFF) - 1:
+            failures.append("kg_to_lb of %dkg is %d, not a half down" % (weight, lb))
+
+    # ResultState's aux weight, of every total in 100ths
+    for end_weight in range(max(weights) * 100 + 1):
+        lb = calculations.round_div(calculations.kg_to_lb(end_weight), 100)
+        if lb != round(round(end_weight * KG_LB_COEFF) / 100):
+            failures.append("aux weight of %d kg 100ths is %dlb" % (end_weight, lb))
+        kg = calculations.round_div(calculations.lb_to_kg(end_weight), 100)
+        if kg != round(round(end_weight / KG_LB_COEFF) / 100):
+            failures.append("aux weight of %d lb 100ths is %dkg" % (end_weight, kg))
+    return failures
+
+
+def get_configs(unit, quick):
+    """Yields (description, weights config) for each plate subset, bar and
+    collar of unit
+    """
+    unit_config = DEFAULT_CONFIG["weights"][unit]
+    labels = list(unit_config["plates"])
+    masks = range(1 << len(labels))
+    if quick:
+        masks = [
+            sum(
+                [
+                    1 << i
+                    for i in range(len(labels))
+                    if unit_config["plates"][labels[i]]["using"]
+                ]
+            )
+        ]
+
+    for mask in masks:
+        for bar in unit_config["bars"]:
+            for collar in unit_config["collars"]:
+                weights = copy_config(DEFAULT_CONFIG["weights"])
+                config = weights[unit]
+                for i in range(len(labels)):
+                    config["plates"][labels[i]]["using"] = bool(mask & (1 << i))
+                for label in config["bars"]:
+                    config["bars"][label]["using"] = label == bar
+                config["bar"] = config["bars"][bar]["value"]
+                for label in config["collars"]:
+                    config["collars"][label]["using"] = label == collar
+                config["collar"] = config["collars"][collar]["value"]
+
+                used = [
+                    label for label in labels if config["plates"][label]["using"]
+                ]
+                yield (
+                    "%s plates [%s] bar %s collar %s"
+                    % (unit, " ".join(used), bar, collar),
+                    weights,
+                )
+
+
+class Reference:
+    """Fewest plates for every per-side sum, from a plain table in units of
+    the plates' common step
+    """
+
+    UNREACHABLE = None
+
+    def __init__(self, profile, limit):
+        self.step = 0
+        for value in profile.values:
+            self.step = gcd(self.step, value)
+        size = limit // self.step + 2 if self.step else 1
+
+        best = [0] + [Reference.UNREACHABLE] * (size - 1)
+        for i in range(len(profile.values)):
+            units = profile.values[i] // self.step
+            pairs = profile.pairs[i]
+            new = list(best)
+            for s in range(units, size):
+                # unlimited plates stack on the new table, limited ones try
+                # every count on the old one
+                if pairs is None:
+                    options = []
+                    if new[s - units] is not None:
+                        options.append(new[s - units] + 1)
+                else:
+                    options = [
+                        best[s - k * units] + k
+                        for k in range(1, min(pairs, s // units) + 1)
+                        if best[s - k * units] is not None
+                    ]
+                if new[s] is not None:
+                    options.append(new[s])
+                if options:
+                    new[s] = min(options)
+            best = new
+        self.best = best
+        self.sums = [s for s in range(size) if best[s] is not None]
+
+    def solve(self, weight):
+        """Returns (per-side sum, plates per side) closest to weight, the
+        heavier one on a tie
+        """
+        if not self.step:
+            return 0, 0
+        i = bisect.bisect_left(self.sums, -(-weight // self.step))
+        s = self.sums[min(i, len(self.sums) - 1)]
+        below = self.sums[max(i - 1, 0)]
+        if weight - below * self.step < s * self.step - weight:
+            s = below
+        return s * self.step, self.best[s]
+
+
+def gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
+
+def parse_weight(text):
+    return calculations.get_label_key(text) // 100
+
+
+class Checker:
+    def __init__(self):
+        self.checks = 0
+        self.failures = {}
+
+    def fail(self, check, description, units, weight, message):
+        examples = self.failures.setdefault(check, [])
+        examples.append(
+            "%s %s->%s %d: %s" % (description, units[0], units[1], weight, message)
+        )
+
+    def check(self, description, units, weight, profile, reference, result, others):
+        """others maps a check name to a result that should equal result"""
+        self.checks += 1
+        counts, end_weight = result
+        target = calculations.to_output_hundredths(weight, units)
+        bar = profile.bar * 100
+        collar = profile.collar
+
+        side = 0
+        plates = 0
+        seen = set()
+        for count, label in counts:
+            i = profile.labels.index(label)
+            pairs = profile.pairs[i]
+            if count <= 0 or label in seen or (pairs is not None and count > pairs):
+                self.fail("symmetric", description, units, weight, repr(counts))
+            seen.add(label)
+            side += count * profile.values[i]
+            plates += count
+        loaded = end_weight != bar or counts
+        expected_total = bar + 2 * (collar + side) if loaded else bar
+        if end_weight != expected_total:
+            self.fail(
+                "symmetric",
+                description,
+                units,
+                weight,
+                "total %d, sides add up to %d" % (end_weight, expected_total),
+            )
+
+        shown = calculations.format_hundredths_weight(end_weight)
+        shown_side = 0
+        for text in calculations.get_plate_count_strings(counts):
+            label, count = text.split("x")
+            shown_side += parse_weight(label) * int(count)
+        shown_total = bar + 2 * (collar + shown_side) if loaded else bar
+        if parse_weight(shown) != end_weight or shown_total != end_weight:
+            self.fail(
+                "displayed",
+                description,
+                units,
+                weight,
+                "total %d shown as %s, plates shown add up to %d"
+                % (end_weight, shown, shown_total),
+            )
+
+        if profile.values and target >= bar + 2 * collar:
+            if abs(end_weight - target) > profile.values[-1] + 1:
+                self.fail(
+                    "nearest",
+                    description,
+                    units,
+                    weight,
+                    "target %d, loaded %d" % (target, end_weight),
+                )
+
+        per_side = (target - bar) // 2
+        if per_side < collar:
+            expected = (bar, 0)
+        else:
+            ref_side, ref_plates = reference.solve(per_side - collar)
+            expected = (bar + 2 * (collar + ref_side), ref_plates)
+        if (end_weight, plates) != expected:
+            self.fail(
+                "reference",
+                description,
+                units,
+                weight,
+                "loaded %d with %d plates a side, reference %d with %d"
+                % (end_weight, plates, expected[0], expected[1]),
+            )
+
+        for check, other in others.items():
+            if other != result:
+                self.fail(
+                    check, description, units, weight, "%r, not %r" % (other, result)
+                )
+
+
+def measure_allocations(interface, units, weights):
+    """Returns the most bytes one call holds at once, and the blocks its
+    result keeps, each averaged over weights. CPython frees temporaries as
+    soon as they go, so this is the memory a call needs rather than a count
+    of every allocation.
+    """
+    tracemalloc.start()
+    peak = 0
+    for weight in weights:
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        calculations.get_plate_counts(weight, units, interface)
+        peak += tracemalloc.get_traced_memory()[1] - start
+    tracemalloc.stop()
+
+    results = []
+    start = sys.getallocatedblocks()
+    for weight in weights:
+        results.append(calculations.get_plate_counts(weight, units, interface))
+    kept = sys.getallocatedblocks() - start
+    return peak / len(weights), kept / len(weights)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--quick", action="store_true", help="only sweep the default plates"
+    )
+    args = parser.parse_args()
+
+    targets = get_targets()
+    missing = [weight for weight in range(NUM_WEIGHTS) if not targets[weight]]
+    if missing:
+        print("weights no percentage rounds to: %s" % missing)
+        return 1
+    weights = range(NUM_WEIGHTS)
+
+    interface = Interface(HeadlessImplementation())
+    checker = Checker()
+    conversion_failures = check_conversions()
+    if conversion_failures:
+        checker.failures["conversions"] = conversion_failures
+    print(
+        "%-10s %8s %10s %12s %12s"
+        % ("units", "configs", "calls", "cold call/s", "warm call/s")
+    )
+    total_calls = 0
+    total_cold = 0
+    total_warm = 0
+    for units in PromptState.UNIT_STATES:
+        configs = 0
+        cold_s = 0
+        warm_s = 0
+        for description, config in get_configs(units[1], args.quick):
+            configs += 1
+            interface.config_write("weights", config)
+            profile = interface.get_profile(units[1])
+            top = calculations.to_output_hundredths(NUM_WEIGHTS - 1, units)
+            reference = Reference(profile, top)
+
+            # a config change starts the solver over, so the first pass
+            # includes building its table
+            start = time.perf_counter()
+            cold = [
+                calculations.get_plate_counts(weight, units, interface)
+                for weight in weights
+            ]
+            cold_s += time.perf_counter() - start
+            start = time.perf_counter()
+            warm = [
+                calculations.get_plate_counts(weight, units, interface)
+                for weight in weights
+            ]
+            warm_s += time.perf_counter() - start
+
+            for weight in weights:
+                checker.check(
+                    description,
+                    units,
+                    weight,
+                    profile,
+                    reference,
+                    cold[weight],
+                    {
+                        "warm": warm[weight],
+                        "table": interface.plate_table.get_plate_counts(
+                            weight, units
+                        ),
+                    },
+                )
+
+        calls = configs * NUM_WEIGHTS
+        total_calls += calls
+        total_cold += cold_s
+        total_warm += warm_s
+        print(
+            "%-10s %8d %10d %12d %12d"
+            % ("%s->%s" % units, configs, calls, calls / cold_s, calls / warm_s)
+        )
+    print(
+        "%-10s %8s %10d %12d %12d"
+        % ("all", "", total_calls, total_calls / total_cold, total_calls / total_warm)
+    )
+
+    # the default config, as a unit boots with it
+    interface.config_write("weights", copy_config(DEFAULT_CONFIG["weights"]))
+    print()
+    for units in PromptState.UNIT_STATES:
+        peak, kept = measure_allocations(interface, units, weights)
+        print(
+            "%s->%s default plates: %.0f bytes peak per call, %.1f blocks kept "
+            "by each result" % (units[0], units[1], peak, kept)
+        )
+
+    print()
+    print(
+        "%d weights (from %d weight and percent pairs) checked in %d configs"
+        % (NUM_WEIGHTS, sum(targets), checker.checks // NUM_WEIGHTS)
+    )
+    print(
+        "conversions checked for %d weights at %d percentages"
+        % (NUM_WEIGHTS, len(CONVERSION_PERCENTS))
+    )
+    if not checker.failures:
+        print("every check passed")
+        return 0
+    for check, examples in sorted(checker.failures.items()):
+        print("FAILED %s: %d results" % (check, len(examples)))
+        for example in examples[:MAX_EXAMPLES]:
+            print("  " + example)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,34 @@
-KG_LB_COEFF = 2.20462
+from array import array
+
+# 1 kg = 2.20462 lb, kept as a fraction since there is no FPU
+KG_LB_NUM = 220462
+KG_LB_DEN = 100000
+
+
+def round_div(n, d):
+    """Returns n / d rounded to the nearest integer, halves to even like
+    round(n / d), for non-negative integers
+    """
+    q, r = divmod(n, d)
+    if 2 * r > d or (2 * r == d and q & 1):
+        q += 1
+    return q
 
 
 def kg_to_lb(kg):
-    return round(kg * KG_LB_COEFF)
+    # exact halves round down, which is where the float product landed for
+    # every weight up to 1000 kg. It rounded 1250 and 5250 kg up, see
+    # benchmarks/plate_counts.py
+    return (kg * KG_LB_NUM + KG_LB_DEN // 2 - 1) // KG_LB_DEN
 
 
 def lb_to_kg(lb):
-    return round(lb / KG_LB_COEFF)
+    # never exactly a half, that would take lb * KG_LB_DEN being an odd
+    # multiple of KG_LB_NUM / 2
+    return (lb * KG_LB_DEN * 2 + KG_LB_NUM) // (KG_LB_NUM * 2)
 
 
-def get_plate_counts(weight, units, interface):
+def to_output_hundredths(weight, units):
     input_unit = units[0]
     output_unit = units[1]
 
@@ -23,9 +42,12 @@ def get_plate_counts(weight, units, interface):
         else:
             weight = lb_to_kg(weight)
 
-    BAR_WEIGHT = interface.config_read("weights")[output_unit]["bar"]
-    COLLAR_WEIGHT = interface.config_read("weights")[output_unit]["collar"]
-    plate_list = interface.config_read("weights")[output_unit]["plates"]
+    return weight
+
+
+def load_bar(weight, profile, solver):
+    BAR_WEIGHT = profile.bar
+    COLLAR_WEIGHT = profile.collar
 
     # subtract the weight of the bar
     weight -= BAR_WEIGHT * 100
@@ -40,32 +62,7 @@ def get_plate_counts(weight, units, interface):
     # subtract weight of one collar on each side
     weight -= COLLAR_WEIGHT
 
-    # use biggest plates first
-    used_plates = sorted(
-        [
-            (plate, value["value"])
-            for plate, value in plate_list.items()
-            if value["using"]
-        ],
-        reverse=True,
-        key=lambda x: x[1],
-    )
-
-    weight = ((weight + used_plates[-1][1] // 2) // used_plates[-1][1]) * used_plates[
-        -1
-    ][1]
-    counts = []
-
-    end_weight = 0
-    for i in range(len(used_plates)):
-        # get the count of this plate we can use
-        count = weight // used_plates[i][1]
-        # reduce the weight by the appropriate amount
-        weight -= count * used_plates[i][1]
-
-        if count > 0:
-            counts.append((count, used_plates[i][0]))
-            end_weight += used_plates[i][1] * count
+    counts, end_weight = solver.solve(weight)
 
     end_weight *= 2
     end_weight += BAR_WEIGHT * 100
@@ -73,6 +70,396 @@ def get_plate_counts(weight, units, interface):
     return counts, end_weight
 
 
+def get_plate_counts(weight, units, interface):
+    return load_bar(
+        to_output_hundredths(weight, units),
+        interface.get_profile(units[1]),
+        interface.plate_table.get_solver(units[1]),
+    )
+
+
+def get_ladder_plate_counts(weight, percents, units, interface):
+    """Loads each percentage of weight, sharing the profile and solver
+    between rungs. Each rung is rounded to a whole input unit before it is
+    converted, as ResultState does, so it loads what entering its
+    percentage would.
+    """
+    profile = interface.get_profile(units[1])
+    solver = interface.plate_table.get_solver(units[1])
+
+    return [
+        load_bar(target, profile, solver)
+        for target in get_ladder_targets(weight, percents, units)
+    ]
+
+
+def get_ladder_targets(weight, percents, units):
+    return [
+        to_output_hundredths(round_div(weight * percent, 100), units)
+        for percent in percents
+    ]
+
+
+class PlateProfile:
+    """The parts of one unit's weight config that the calculations and menus
+    read, taken out of the config once per change to it. Plates in use are
+    sorted biggest first.
+    """
+
+    def __init__(self, weight_config):
+        used_plates = sorted(
+            [
+                (plate, value["value"], value.get("pairs"))
+                for plate, value in weight_config["plates"].items()
+                if value["using"]
+            ],
+            reverse=True,
+            key=lambda x: x[1],
+        )
+        self.labels = tuple(plate[0] for plate in used_plates)
+        self.values = tuple(plate[1] for plate in used_plates)
+        self.pairs = tuple(plate[2] for plate in used_plates)
+
+        self.bar = weight_config["bar"]
+        self.collar = weight_config["collar"]
+        self.bar_labels = tuple(
+            bar for bar, value in weight_config["bars"].items() if value["using"]
+        )
+        self.collar_labels = tuple(
+            collar
+            for collar, value in weight_config["collars"].items()
+            if value["using"]
+        )
+
+
+def gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
+
+class PlateSolver:
+    """Finds the per-side loading closest to a target using the fewest plates.
+    Plates may carry an optional "pairs" field limiting how many pairs are
+    available, otherwise they are unlimited. The DP table is kept between
+    calls and only grows when a heavier target comes in.
+    """
+
+    UNREACHABLE = 0xFFFF
+
+    def __init__(self, profile):
+        # use biggest plates first, as the profile has them
+        self.labels = profile.labels
+        self.pairs = profile.pairs
+
+        # work in multiples of the largest step every plate shares
+        self.step = 0
+        for value in profile.values:
+            self.step = gcd(self.step, value)
+        self.values = tuple(value // self.step for value in profile.values)
+
+        # items are (plate index, plate count, unbounded), bounded inventories
+        # are split into 1, 2, 4, ... so each count is reachable as a 0/1 choice.
+        # Smallest plates go first so bigger plates win ties on plate count
+        self.items = []
+        self.capacity = 0
+        for i in range(len(self.values) - 1, -1, -1):
+            pairs = self.pairs[i]
+            if pairs is None:
+                self.items.append((i, 1, True))
+                self.capacity = None
+                continue
+
+            if self.capacity is not None:
+                self.capacity += pairs * self.values[i]
+            count = 1
+            while pairs > 0:
+                count = min(count, pairs)
+                self.items.append((i, count, False))
+                pairs -= count
+                count *= 2
+
+        self.limit = -1
+        self.best = None
+        self.choices = None
+
+    def build(self, limit):
+        if self.capacity is not None:
+            limit = min(limit, self.capacity)
+
+        best = array("H", b"\xff\xff" * (limit + 1))
+        best[0] = 0
+        choices = []
+        for plate, count, unbounded in self.items:
+            value = self.values[plate] * count
+            taken = bytearray(limit // 8 + 1)
+            if unbounded:
+                sums = range(value, limit + 1)
+            else:
+                sums = range(limit, value - 1, -1)
+
+            for s in sums:
+                prev = best[s - value]
+                if prev != PlateSolver.UNREACHABLE and prev + count <= best[s]:
+                    best[s] = prev + count
+                    taken[s >> 3] |= 1 << (s & 7)
+            choices.append(taken)
+
+        self.limit = limit
+        self.best = best
+        self.choices = choices
+
+    def ensure(self, limit):
+        if limit > self.limit and (
+            self.capacity is None or self.limit < self.capacity
+        ):
+            # leave some headroom so nearby targets reuse the table
+            self.build(limit + limit // 4)
+
+    def find_counts(self, s):
+        counts = [0] * len(self.values)
+        for j in range(len(self.items) - 1, -1, -1):
+            plate, count, unbounded = self.items[j]
+            value = self.values[plate] * count
+            taken = self.choices[j]
+            while taken[s >> 3] & (1 << (s & 7)):
+                counts[plate] += count
+                s -= value
+                if not unbounded:
+                    break
+        return counts
+
+    def solve(self, weight):
+        """Returns the plate counts and the per-side weight they add up to,
+        both weights in 100ths
+        """
+        if not self.values:
+            return [], 0
+
+        target = weight // self.step
+        self.ensure(target + 1 + max(self.values))
+
+        # closest reachable sums at or below, and at or above the target
+        below = min(target, self.limit)
+        while self.best[below] == PlateSolver.UNREACHABLE:
+            below -= 1
+        above = target + (weight % self.step > 0)
+        while above <= self.limit and self.best[above] == PlateSolver.UNREACHABLE:
+            above += 1
+
+        s = below
+        if above <= self.limit:
+            below_diff = weight - below * self.step
+            above_diff = above * self.step - weight
+            # round halfway targets up, like rounding to the smallest plate did
+            if above_diff <= below_diff:
+                s = above
+
+        counts = self.find_counts(s)
+        return [
+            (counts[i], self.labels[i]) for i in range(len(counts)) if counts[i] > 0
+        ], s * self.step
+
+    def get_vector(self, counts):
+        vector = [0] * len(self.values)
+        for count, label in counts:
+            vector[self.labels.index(label)] = count
+        return vector
+
+    def get_loadings(self, vector, extra_plates=2, limit=16):
+        """Returns other count vectors that add up to the same per-side weight
+        as vector, using at most extra_plates more plates than it does
+        """
+        loadings = []
+        self.search_loadings(
+            0,
+            sum([vector[i] * self.values[i] for i in range(len(vector))]),
+            sum(vector) + extra_plates,
+            [0] * len(vector),
+            loadings,
+            limit,
+        )
+        return loadings
+
+    def search_loadings(self, i, remaining, plates_left, curr, loadings, limit):
+        if remaining == 0:
+            loadings.append(list(curr))
+            return
+        if i == len(self.values) or len(loadings) >= limit:
+            return
+
+        # try the most of the biggest plates first, like loading a bar by hand
+        most = min(remaining // self.values[i], plates_left)
+        if self.pairs[i] is not None:
+            most = min(most, self.pairs[i])
+        for count in range(most, -1, -1):
+            curr[i] = count
+            self.search_loadings(
+                i + 1,
+                remaining - count * self.values[i],
+                plates_left - count,
+                curr,
+                loadings,
+                limit,
+            )
+        curr[i] = 0
+
+
+class WeightIndex:
+    """Sorted totals, in 100ths, that the bar can be loaded to with the
+    profile's bar, collars and plates, read off the solver's DP table. It
+    grows along with that table when a heavier target comes in.
+    """
+
+    def __init__(self, profile, solver):
+        self.profile = profile
+        self.solver = solver
+        self.totals = array("L")
+        # totals up to limit are all in the index
+        self.limit = -1
+
+    def build(self, total):
+        profile = self.profile
+        solver = self.solver
+        bar = profile.bar * 100
+        base = bar + profile.collar * 2
+
+        self.totals = array("L", [bar])
+        if not solver.values:
+            self.limit = PlateTable.NO_LIMIT
+            if base != bar:
+                self.totals.append(base)
+            return
+
+        solver.ensure((total - base) // 2 // solver.step + 1 + max(solver.values))
+        best = solver.best
+        for s in range(solver.limit + 1):
+            total = base + s * solver.step * 2
+            # without collars an empty bar is already in
+            if best[s] != PlateSolver.UNREACHABLE and total > bar:
+                self.totals.append(total)
+
+        if solver.capacity is not None and solver.limit >= solver.capacity:
+            self.limit = PlateTable.NO_LIMIT
+        else:
+            self.limit = base + solver.limit * solver.step * 2
+
+    def get_nearest(self, total):
+        """Returns the closest totals at or below, and at or above total,
+        either one None if there isn't one
+        """
+        if total > self.limit:
+            self.build(total)
+
+        i = bisect_left(self.totals, total)
+        above = self.totals[i] if i < len(self.totals) else None
+        if above == total:
+            return total, total
+        below = self.totals[i - 1] if i > 0 else None
+        return below, above
+
+
+def bisect_left(values, x):
+    """Returns the index of the first of the sorted values that is >= x, or
+    len(values), like bisect.bisect_left which MicroPython doesn't have
+    """
+    low = 0
+    high = len(values)
+    while low < high:
+        mid = (low + high) // 2
+        if values[mid] < x:
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
+
+def get_plate_sequence(targets, units, interface):
+    """Loads each target, in 100ths of the output unit, in order so the total
+    number of plates put on and taken off one side, starting from an empty
+    bar, is as low as possible.
+    Every set weighs what load_bar gives its target, only the plates making
+    it up may differ. Returns (counts, end_weight, changes) per set.
+    """
+    profile = interface.get_profile(units[1])
+    solver = interface.plate_table.get_solver(units[1])
+
+    options = []
+    end_weights = []
+    for target in targets:
+        counts, end_weight = load_bar(target, profile, solver)
+        options.append(solver.get_loadings(solver.get_vector(counts)))
+        end_weights.append(end_weight)
+
+    # shortest path through the layers of loadings, one layer per set
+    empty = [0] * len(solver.values)
+    costs = [get_change_count(empty, loading) for loading in options[0]]
+    parents = [[]]
+    for i in range(1, len(options)):
+        curr_costs = []
+        curr_parents = []
+        for loading in options[i]:
+            best = 0
+            best_cost = None
+            for j in range(len(options[i - 1])):
+                cost = costs[j] + get_change_count(options[i - 1][j], loading)
+                if best_cost is None or cost < best_cost:
+                    best = j
+                    best_cost = cost
+            curr_costs.append(best_cost)
+            curr_parents.append(best)
+        costs = curr_costs
+        parents.append(curr_parents)
+
+    chosen = costs.index(min(costs))
+    vectors = []
+    for i in range(len(options) - 1, -1, -1):
+        vectors.insert(0, options[i][chosen])
+        if i > 0:
+            chosen = parents[i][chosen]
+
+    result = []
+    prev_vector = empty
+    for j in range(len(vectors)):
+        vector = vectors[j]
+        counts = [
+            (vector[i], solver.labels[i]) for i in range(len(vector)) if vector[i] > 0
+        ]
+        # signed changes to one side, biggest plates first
+        changes = [
+            (vector[i] - prev_vector[i], solver.labels[i])
+            for i in range(len(vector))
+            if vector[i] != prev_vector[i]
+        ]
+        result.append((counts, end_weights[j], changes))
+        prev_vector = vector
+    return result
+
+
+def get_change_count(prev_vector, vector):
+    return sum([abs(vector[i] - prev_vector[i]) for i in range(len(vector))])
+
+
+def get_plate_change_strings(changes):
+    result = []
+    for change, label in changes:
+        sign = "+" if change > 0 else "-"
+        if abs(change) > 1:
+            result.append("%s%sx%d" % (sign, label, abs(change)))
+        else:
+            result.append(sign + label)
+    return result
+
+
+def get_label_key(label):
+    """Sort key for labels like "2.5" or "1.25", in the order of their
+    values, without parsing them as floats
+    """
+    parts = label.split(".")
+    frac = parts[1] if len(parts) > 1 else ""
+    return int(parts[0]) * 10000 + int((frac + "0000")[:4])
+
+
 def format_hundredths_weight(weight):
     if weight % 100 == 0:
         return str(weight // 100)
@@ -84,3 +471,147 @@ def format_hundredths_weight(weight):
 
 def get_plate_count_strings(counts):
     return ["{label}x{qty}".format(label=count[1], qty=count[0]) for count in counts]
+
+
+class PlateTableSlot:
+    def __init__(self, units, interface):
+        profile = interface.get_profile(units[1])
+
+        self.units = units
+        self.bar = profile.bar
+        self.collar = profile.collar
+        self.labels = profile.labels
+        self.values = profile.values
+
+        # one count byte per plate, followed by a flag byte
+        self.stride = len(self.values) + 1
+        self.entries = bytearray(
+            bytes((PlateTable.UNBUILT,)) * (self.stride * PlateTable.NUM_WEIGHTS)
+        )
+        self.next_weight = 0
+
+    def fill(self, weight, interface):
+        offset = weight * self.stride
+        flag_offset = offset + self.stride - 1
+
+        counts, end_weight = get_plate_counts(weight, self.units, interface)
+        for i in range(self.stride - 1):
+            self.entries[offset + i] = 0
+
+        flag = PlateTable.BUILT
+        if not counts and end_weight == self.bar * 100:
+            flag = PlateTable.BAR_ONLY
+        for count, label in counts:
+            if count > PlateTable.MAX_COUNT:
+                flag = PlateTable.FALLBACK
+                break
+            self.entries[offset + self.labels.index(label)] = count
+        self.entries[flag_offset] = flag
+
+    def read(self, weight):
+        offset = weight * self.stride
+        flag = self.entries[offset + self.stride - 1]
+        if flag == PlateTable.BAR_ONLY:
+            return [], self.bar * 100
+
+        counts = []
+        end_weight = 0
+        for i in range(self.stride - 1):
+            count = self.entries[offset + i]
+            if count > 0:
+                counts.append((count, self.labels[i]))
+                end_weight += self.values[i] * count
+
+        end_weight *= 2
+        end_weight += self.bar * 100
+        end_weight += self.collar * 2
+        return counts, end_weight
+
+    def flag(self, weight):
+        return self.entries[weight * self.stride + self.stride - 1]
+
+
+class PlateTable:
+    # covers every weight PromptState can produce at 100%, and every weight
+    # a percentage can scale down to
+    NUM_WEIGHTS = 1000
+    # weights filled in per idle call, keeps each call well under a keypad scan
+    BUILD_STEP = 8
+    MAX_COUNT = 0xFD
+
+    BUILT = 0
+    BAR_ONLY = 1
+    FALLBACK = 0xFE
+    UNBUILT = 0xFF
+
+    # WeightIndex limit when every reachable total is already in it
+    NO_LIMIT = 0xFFFFFFFF
+
+    def __init__(self, interface):
+        self.interface = interface
+        self.version = interface.weights_version
+        self.selected_units = None
+        self.slots = {}
+        self.solvers = {}
+        self.indexes = {}
+
+    def check_version(self):
+        # any change to plates, bars or collars invalidates every slot
+        if self.version != self.interface.weights_version:
+            self.version = self.interface.weights_version
+            self.slots = {}
+            self.solvers = {}
+            self.indexes = {}
+
+    def get_solver(self, unit):
+        self.check_version()
+        if unit not in self.solvers:
+            self.solvers[unit] = PlateSolver(self.interface.get_profile(unit))
+        return self.solvers[unit]
+
+    def get_index(self, unit):
+        self.check_version()
+        if unit not in self.indexes:
+            self.indexes[unit] = WeightIndex(
+                self.interface.get_profile(unit), self.get_solver(unit)
+            )
+        return self.indexes[unit]
+
+    def get_slot(self, units):
+        self.check_version()
+        if units not in self.slots:
+            self.slots[units] = PlateTableSlot(units, self.interface)
+        return self.slots[units]
+
+    def select(self, units):
+        """Sets the units that build_step fills in while waiting for keys"""
+        self.selected_units = units
+
+    def build_step(self):
+        if self.selected_units is None:
+            return
+
+        slot = self.get_slot(self.selected_units)
+        built = 0
+        while (
+            slot.next_weight < PlateTable.NUM_WEIGHTS
+            and built < PlateTable.BUILD_STEP
+        ):
+            if slot.flag(slot.next_weight) == PlateTable.UNBUILT:
+                slot.fill(slot.next_weight, self.interface)
+                built += 1
+            slot.next_weight += 1
+
+    def get_plate_counts(self, weight, units):
+        if 0 <= weight < PlateTable.NUM_WEIGHTS:
+            slot = self.get_slot(units)
+            if slot.flag(weight) == PlateTable.UNBUILT:
+                slot.fill(weight, self.interface)
+            if slot.flag(weight) != PlateTable.FALLBACK:
+                return slot.read(weight)
+
+        return get_plate_counts(weight, units, self.interface)
+
+    def size(self):
+        """Returns the number of bytes held by the table entries"""
+        return sum([len(slot.entries) for slot in self.slots.values()])
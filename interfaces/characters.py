@@ -1,8 +1,32 @@
 class CustomCharacters:
-    SCROLL_UP_LABEL = {"bytes": [0x0E, 0x0A, 0x0E, 0x0A, 0x0E, 0x00, 0x04, 0x0E]}
+    # glyphs are uploaded to CGRAM as they are used, see Interface.get_glyph,
+    # fallback is shown instead if all 8 slots are taken
+    SCROLL_UP_LABEL = {
+        "bytes": [0x0E, 0x0A, 0x0E, 0x0A, 0x0E, 0x00, 0x04, 0x0E],
+        "fallback": "^",
+    }
 
-    SCROLL_DOWN_LABEL = {"bytes": [0x0E, 0x04, 0x00, 0x0E, 0x0A, 0x0E, 0x02, 0x02]}
+    SCROLL_DOWN_LABEL = {
+        "bytes": [0x0E, 0x04, 0x00, 0x0E, 0x0A, 0x0E, 0x02, 0x02],
+        "fallback": "v",
+    }
 
-    CHARACTERS = [SCROLL_UP_LABEL, SCROLL_DOWN_LABEL]
-    for i in range(len(CHARACTERS)):
-        CHARACTERS[i]["index"] = i
+    # plates are 4 pixels wide and 2, 4, 6 or 8 pixels tall on each side of
+    # the line between the two rows
+    PLATE_LEVELS = 4
+    PLATE_PIXELS = 0x1E
+
+    PLATE_GLYPHS = {}
+
+    def get_plate_glyph(level, top):
+        """Returns the glyph for the top or bottom half of a plate, level
+        1 being the shortest and PLATE_LEVELS the tallest
+        """
+        key = (level, top)
+        if key not in CustomCharacters.PLATE_GLYPHS:
+            height = level * 8 // CustomCharacters.PLATE_LEVELS
+            rows = [0x00] * 8
+            for i in range(height):
+                rows[7 - i if top else i] = CustomCharacters.PLATE_PIXELS
+            CustomCharacters.PLATE_GLYPHS[key] = {"bytes": rows, "fallback": "|"}
+        return CustomCharacters.PLATE_GLYPHS[key]
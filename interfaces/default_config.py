@@ -0,0 +1,49 @@
+# what ConfigManager fills in for any key the stored config is missing
+DEFAULT_CONFIG = {
+    "weights": {
+        "LB": {
+            "plates": {
+                "55": {"using": False, "value": 5500},
+                "45": {"using": True, "value": 4500},
+                "35": {"using": False, "value": 3500},
+                "25": {"using": True, "value": 2500},
+                "10": {"using": True, "value": 1000},
+                "5": {"using": True, "value": 500},
+                "2.5": {"using": True, "value": 250},
+                "1.25": {"using": False, "value": 125},
+            },
+            "bars": {
+                "45": {"using": True, "value": 45},
+                "35": {"using": False, "value": 35},
+            },
+            "bar": 45,
+            "collars": {"0": {"using": True, "value": 0}},
+            "collar": 0,
+        },
+        "KG": {
+            "plates": {
+                "25": {"using": True, "value": 2500},
+                "20": {"using": True, "value": 2000},
+                "15": {"using": True, "value": 1500},
+                "10": {"using": True, "value": 1000},
+                "5": {"using": True, "value": 500},
+                "2.5": {"using": True, "value": 250},
+                "1.25": {"using": True, "value": 125},
+            },
+            "bars": {
+                "20": {"using": True, "value": 20},
+                "15": {"using": False, "value": 15},
+            },
+            "bar": 20,
+            "collars": {
+                "0": {"using": True, "value": 0},
+                "1.25": {"using": False, "value": 125},
+                "2.5": {"using": False, "value": 250},
+            },
+            "collar": 0,
+        },
+    },
+    "prompt": {"unit_state": 0},
+    # events kept by the tracing ring buffer, 0 leaves it off, see Tracer
+    "trace": {"events": 0},
+}
@@ -1,9 +1,53 @@
 import ujson
+import uos
+from ubinascii import crc32
+from utime import ticks_ms, ticks_diff
+from .hardware_packed import PackedWeights, pack_weights, to_dict
+from ..default_config import DEFAULT_CONFIG
 
 
 class ConfigManager:
-    def __init__(self, filename):
+    # compact once the log has grown this far past its last compacted size
+    COMPACT_SLACK = 2048
+
+    def __init__(
+        self,
+        filename,
+        json_filename=None,
+        packed_filename=None,
+        write_back=False,
+        flush_after_ms=5000,
+    ):
+        """The config is kept in filename as an append-only log. Each record
+        holds one leaf of the config, e.g. weights/LB/plates/45/using, with a
+        sequence number and a checksum, so saving only appends the leaves that
+        changed. The log is replayed at boot, stopping at the first bad
+        record, and rewritten in one go once it grows past COMPACT_SLACK.
+        If there is no log yet, the config in json_filename is moved into it.
+        With packed_filename set, compacting packs "weights" into that file
+        instead (see PackedWeights), which is read back with one readinto,
+        and the log only holds the changes made since. Weights that don't fit
+        the packed layout stay in the log like the rest of the config.
+        With write_back set, write only marks the key dirty, and the log is
+        appended to by flush, or by idle once nothing has been written for
+        flush_after_ms.
+        """
         self.filename = filename
+        self.json_filename = json_filename
+        self.packed_filename = packed_filename
+        self.write_back = write_back
+        self.flush_after_ms = flush_after_ms
+        self.dirty = set()
+        self.last_write = 0
+
+        # leaf path -> json of the value the log holds for it
+        self.persisted = {}
+        self.seq = 0
+        self.log_size = 0
+        self.compacted_size = 0
+        # "weights" didn't fit the packed layout, so it is kept in the log
+        self.pack_failed = False
+
         self.load_cache()
         self.confirm_config_init()
 
@@ -11,71 +55,226 @@ class ConfigManager:
         for key, val in ConfigManager.DEFAULT_CONFIG.items():
             if key not in self.cache:
                 self.cache[key] = val
-        self.save_cache()
+                self.dirty.add(key)
+
+        # only touch the flash on boot if a default was missing
+        if self.dirty:
+            self.flush()
 
     def load_cache(self):
+        self.cache = {}
+        if self.packed_filename is not None:
+            try:
+                buf = bytearray(uos.stat(self.packed_filename)[6])
+                with open(self.packed_filename, "rb") as f:
+                    f.readinto(buf)
+                self.cache["weights"] = PackedWeights(buf)
+            except (OSError, ValueError):
+                pass
+
         try:
             f = open(self.filename)
-            self.cache = ujson.load(f)
         except OSError:
-            f = open(self.filename, "w+")
-            self.cache = {}
-        f.close()
+            self.migrate()
+            return
+
+        packed = "weights" in self.cache
+        intact = True
+        with f:
+            for line in f:
+                if not self.replay(line):
+                    intact = False
+                    break
+        self.compacted_size = self.log_size
+        if isinstance(self.cache.get("weights"), PackedWeights):
+            self.cache["weights"].changes = []
+        elif not self.is_packed():
+            try:
+                pack_weights(self.cache["weights"])
+            except ValueError:
+                # they didn't fit when the log was compacted either
+                self.pack_failed = True
+
+        # a write was cut off, appending after it would hide the new records,
+        # and packed weights the log went back to dicts over are stale
+        stale = packed and not self.is_packed()
+        if not intact or stale or self.needs_packing():
+            self.compact()
+
+    def is_packed(self):
+        return (
+            self.packed_filename is None
+            or "weights" not in self.cache
+            or isinstance(self.cache["weights"], PackedWeights)
+        )
+
+    def needs_packing(self):
+        return not self.is_packed() and not self.pack_failed
+
+    def export_json(self, filename):
+        with open(filename, "w") as f:
+            ujson.dump(to_dict(self.cache), f)
+
+    def migrate(self):
+        if self.json_filename is None:
+            return
+        try:
+            with open(self.json_filename) as f:
+                self.cache = ujson.load(f)
+        except (OSError, ValueError):
+            return
+
+        self.compact()
+        uos.remove(self.json_filename)
+
+    def replay(self, line):
+        if not line.endswith("\n"):
+            return False
+        try:
+            seq, crc, path, value = line[:-1].split(" ", 3)
+            seq = int(seq)
+        except ValueError:
+            return False
+        if self.seq and seq != self.seq + 1:
+            return False
+        if "%08x" % crc32(("%d %s %s" % (seq, path, value)).encode()) != crc:
+            return False
+
+        try:
+            curr = self.set_leaf(path, value)
+        except (KeyError, TypeError):
+            # packed weights only hold the entries they were packed with, so
+            # a log written when they didn't fit goes back to dicts
+            if not isinstance(self.cache.get("weights"), PackedWeights):
+                raise
+            self.cache["weights"] = to_dict(self.cache["weights"])
+            curr = self.set_leaf(path, value)
+
+        # packed values keep track of their own changes
+        if isinstance(curr, dict):
+            self.persisted[path] = value
+        self.seq = seq
+        self.log_size += len(line)
+        return True
+
+    def set_leaf(self, path, value):
+        """Sets the leaf at path to the json value, and returns its parent"""
+        keys = path.split("/")
+        curr = self.cache
+        for key in keys[:-1]:
+            if key not in curr:
+                curr[key] = {}
+            curr = curr[key]
+        curr[keys[-1]] = ujson.loads(value)
+        return curr
+
+    def make_record(self, path, value):
+        self.seq += 1
+        body = "%d %s %s" % (self.seq, path, value)
+        record = "%d %08x %s %s\n" % (self.seq, crc32(body.encode()), path, value)
+        self.log_size += len(record)
+        return record
+
+    def flatten(self, path, value, leaves):
+        if isinstance(value, dict) and value:
+            for key, child in value.items():
+                self.flatten(path + "/" + key, child, leaves)
+        else:
+            leaves[path] = ujson.dumps(value)
 
     def read(self, key):
         return self.cache[key]
 
     def save_cache(self):
-        with open(self.filename, "w") as f:
-            ujson.dump(self.cache, f)
+        if self.needs_packing():
+            self.compact()
+            return
+
+        records = []
+        leaves = {}
+        for key in self.dirty:
+            value = self.cache[key]
+            if isinstance(value, PackedWeights):
+                for path in value.changes:
+                    records.append(
+                        self.make_record(
+                            key + "/" + path, ujson.dumps(value.lookup(path))
+                        )
+                    )
+                value.changes = []
+            else:
+                self.flatten(key, value, leaves)
+
+        for path, value in leaves.items():
+            if self.persisted.get(path) != value:
+                records.append(self.make_record(path, value))
+                self.persisted[path] = value
+
+        if records:
+            with open(self.filename, "a") as f:
+                f.write("".join(records))
+
+        if self.log_size > self.compacted_size + ConfigManager.COMPACT_SLACK:
+            self.compact()
+
+    def compact(self):
+        leaves = {}
+        packed = None
+        self.pack_failed = False
+        for key, value in self.cache.items():
+            if key == "weights" and self.packed_filename is not None:
+                try:
+                    packed = pack_weights(value)
+                    continue
+                except ValueError:
+                    # fall back to keeping it in the log
+                    self.pack_failed = True
+            self.flatten(key, value, leaves)
+
+        if packed is not None:
+            temp_filename = self.packed_filename + ".tmp"
+            with open(temp_filename, "wb") as f:
+                f.write(packed)
+            uos.rename(temp_filename, self.packed_filename)
+            self.cache["weights"] = PackedWeights(packed)
+
+        # if power is lost before the log is replaced, replaying the old one
+        # over the new packed weights still gives the same config
+        self.persisted = leaves
+        self.log_size = 0
+        temp_filename = self.filename + ".tmp"
+        with open(temp_filename, "w") as f:
+            for path, value in leaves.items():
+                f.write(self.make_record(path, value))
+        # the old log stays whole until the new one replaces it
+        uos.rename(temp_filename, self.filename)
+        self.compacted_size = self.log_size
+
+        # the log holds all the weights now, and an old packed file would
+        # only be loaded under them
+        if self.pack_failed:
+            try:
+                uos.remove(self.packed_filename)
+            except OSError:
+                pass
 
     def write(self, key, value):
         self.cache[key] = value
-        self.save_cache()
-
-    DEFAULT_CONFIG = {
-        "weights": {
-            "LB": {
-                "plates": {
-                    "55": {"using": False, "value": 5500},
-                    "45": {"using": True, "value": 4500},
-                    "35": {"using": False, "value": 3500},
-                    "25": {"using": True, "value": 2500},
-                    "10": {"using": True, "value": 1000},
-                    "5": {"using": True, "value": 500},
-                    "2.5": {"using": True, "value": 250},
-                    "1.25": {"using": False, "value": 125},
-                },
-                "bars": {
-                    "45": {"using": True, "value": 45},
-                    "35": {"using": False, "value": 35},
-                },
-                "bar": 45,
-                "collars": {"0": {"using": True, "value": 0}},
-                "collar": 0,
-            },
-            "KG": {
-                "plates": {
-                    "25": {"using": True, "value": 2500},
-                    "20": {"using": True, "value": 2000},
-                    "15": {"using": True, "value": 1500},
-                    "10": {"using": True, "value": 1000},
-                    "5": {"using": True, "value": 500},
-                    "2.5": {"using": True, "value": 250},
-                    "1.25": {"using": True, "value": 125},
-                },
-                "bars": {
-                    "20": {"using": True, "value": 20},
-                    "15": {"using": False, "value": 15},
-                },
-                "bar": 20,
-                "collars": {
-                    "0": {"using": True, "value": 0},
-                    "1.25": {"using": False, "value": 125},
-                    "2.5": {"using": False, "value": 250},
-                },
-                "collar": 0,
-            },
-        },
-        "prompt": {"unit_state": 0},
-    }
+        self.dirty.add(key)
+        self.last_write = ticks_ms()
+        if not self.write_back:
+            self.flush()
+
+    def flush(self):
+        if self.dirty:
+            self.save_cache()
+            self.dirty = set()
+
+    def idle(self):
+        if (
+            self.dirty
+            and ticks_diff(ticks_ms(), self.last_write) >= self.flush_after_ms
+        ):
+            self.flush()
+
+    DEFAULT_CONFIG = DEFAULT_CONFIG
@@ -3,20 +3,30 @@ from .hardware_keypad import Keypad
 from .hardware_config import ConfigManager
 from utime import time, sleep_ms
 import machine
-from ..characters import CustomCharacters
 
 
 class HardwareImplementation:
-    CONFIG_FILENAME = "config.json"
-
-    def __init__(self, keypad_row_pins, keypad_col_pins, display_pins):
+    CONFIG_FILENAME = "config.log"
+    # configs from before the log get moved into it
+    JSON_CONFIG_FILENAME = "config.json"
+    PACKED_CONFIG_FILENAME = "weights.bin"
+
+    def __init__(
+        self, keypad_row_pins, keypad_col_pins, display_pins, display_bus=None
+    ):
         self.keypad_row_pins = keypad_row_pins
         self.keypad_col_pins = keypad_col_pins
         self.display_pins = display_pins
+        self.display_bus = display_bus
 
-        self.config_manager = ConfigManager(HardwareImplementation.CONFIG_FILENAME)
+        self.config_manager = ConfigManager(
+            HardwareImplementation.CONFIG_FILENAME,
+            HardwareImplementation.JSON_CONFIG_FILENAME,
+            HardwareImplementation.PACKED_CONFIG_FILENAME,
+            write_back=True,
+        )
 
-        self.keypad = Keypad(keypad_row_pins, keypad_col_pins)
+        self.keypad = Keypad(keypad_row_pins, keypad_col_pins, use_irq=True)
         self.make_display()
 
     def config_read(self, key):
@@ -25,6 +35,9 @@ class HardwareImplementation:
     def config_write(self, key, value):
         self.config_manager.write(key, value)
 
+    def config_flush(self):
+        self.config_manager.flush()
+
     def blink_cursor_at(self, i, j):
         self.display.move_to(i, j)
         self.display.blink_cursor_on()
@@ -49,15 +62,20 @@ class HardwareImplementation:
             self.display_pins["D5"],
             self.display_pins["D6"],
             self.display_pins["D7"],
+            rw_pin=self.display_pins.get("RW"),
+            poll_busy="RW" in self.display_pins,
+            bus=self.display_bus,
         )
 
-        for character in CustomCharacters.CHARACTERS:
-            self.display.custom_char(character["index"], character["bytes"])
-
     def sleep_callback_reset(pin):
         machine.reset()
 
     def set_sleep(self):
+        # deepsleep wakes up through a reset, so anything unsaved is lost
+        self.config_manager.flush()
+        # the key that asked for sleep is most likely still down, and would
+        # fire the wake interrupt as soon as it is armed
+        self.keypad.wait_released()
         self.display_off()
         for p in self.keypad_row_pins:
             p.low()
@@ -78,6 +96,16 @@ class HardwareImplementation:
             self.make_display()
         self.display.writestr(text, i, j)
 
+    def upload_glyph(self, slot, charmap):
+        if self.display is None:
+            self.make_display()
+        self.display.custom_char(slot, charmap)
+
+    def scroll_display(self, column):
+        if self.display is None:
+            self.make_display()
+        self.display.scroll_to(column)
+
     def clear_display(self):
         if self.display is None:
             self.make_display()
@@ -102,4 +130,7 @@ class HardwareImplementation:
         return time()
 
     def read_key(self):
-        return self.keypad.read_key()
+        key = self.keypad.read_key()
+        if key is None:
+            self.config_manager.idle()
+        return key
@@ -1,12 +1,61 @@
-from machine import Pin
-from utime import sleep_ms
-from ..interface import Interface
+from machine import Pin, idle
+from utime import ticks_ms, ticks_diff, ticks_add
+from ..interface import Interface, Key
 
 
 class Keypad:
-    def __init__(self, rowpins, colpins):
+    # keys decoded by poll wait here until read_key
+    QUEUE_SIZE = 8
+
+    # per key debounce states
+    UP = 0
+    PRESSING = 1
+    DOWN = 2
+    RELEASING = 3
+
+    def __init__(
+        self,
+        rowpins,
+        colpins,
+        use_irq=False,
+        debounce_ms=20,
+        repeat_delay_ms=400,
+        repeat_rate_ms=100,
+        repeat_keys=(Key.EIGHT, Key.NINE),
+        long_press_ms=1000,
+        long_press_keys=(),
+    ):
+        """Scans the keypad without blocking. Each key has its own debounce
+        state, so any number of keys can be down at once. Keys in repeat_keys
+        queue Key.REPEAT | key every repeat_rate_ms once they have been held
+        for repeat_delay_ms. Keys in long_press_keys also queue
+        Key.LONG_PRESS | key once held for long_press_ms.
+        """
         self.rows = rowpins
         self.cols = colpins
+        self.use_irq = use_irq
+        self.debounce_ms = debounce_ms
+        self.repeat_delay_ms = repeat_delay_ms
+        self.repeat_rate_ms = repeat_rate_ms
+        self.repeat_keys = repeat_keys
+        self.long_press_ms = long_press_ms
+        self.long_press_keys = long_press_keys
+
+        num_keys = len(self.rows) * len(self.cols)
+        self.states = bytearray(num_keys)
+        # ticks_ms of the last raw change, press, and next repeat per key
+        self.changed_at = [0] * num_keys
+        self.pressed_at = [0] * num_keys
+        self.next_repeat = [0] * num_keys
+        self.long_pending = bytearray(num_keys)
+
+        self.queue = bytearray(Keypad.QUEUE_SIZE)
+        self.queue_start = 0
+        self.queue_len = 0
+
+        self.scanning = False
+        # whether any key is not UP, only then does poll have work to do
+        self.active = not self.use_irq
 
         for rowpin in self.rows:
             rowpin.init(Pin.OUT)
@@ -14,25 +63,116 @@ class Keypad:
         for colpin in self.cols:
             colpin.init(Pin.IN, pull=Pin.PULL_DOWN)
 
-    def wait_up(self, col):
-        while not self.check_cell_db(col, desired=0, time_betw=2, intervals=10):
-            pass
+        if self.use_irq:
+            self.arm()
 
-    def check_cell_db(self, col, desired=1, time_betw=2, intervals=10):
-        # assume row is set to high
-        for i in range(intervals):
-            if self.cols[col].value() != desired:
-                return False
-            sleep_ms(time_betw)
-        return True
+    def arm(self):
+        # with every row high, pressing any key raises its column
+        for rowpin in self.rows:
+            rowpin.high()
+        for colpin in self.cols:
+            colpin.irq(handler=self.on_press, trigger=Pin.IRQ_RISING)
 
-    def read_key(self):
+    def on_press(self, pin):
+        # this is a soft interrupt, so it runs between bytecodes of whatever
+        # is going on, e.g. a render, and the press is timestamped right away
+        if not self.scanning:
+            self.active = True
+            self.poll()
+
+    def push(self, key):
+        if self.queue_len == Keypad.QUEUE_SIZE:
+            return
+        self.queue[(self.queue_start + self.queue_len) % Keypad.QUEUE_SIZE] = key
+        self.queue_len += 1
+
+    def pop(self):
+        if self.queue_len == 0:
+            return None
+        key = self.queue[self.queue_start]
+        self.queue_start = (self.queue_start + 1) % Keypad.QUEUE_SIZE
+        self.queue_len -= 1
+        return key
+
+    def update_key(self, i, key, down, now):
+        state = self.states[i]
+        if state == Keypad.UP:
+            if down:
+                self.states[i] = Keypad.PRESSING
+                self.changed_at[i] = now
+        elif state == Keypad.PRESSING:
+            if not down:
+                self.states[i] = Keypad.UP
+            elif ticks_diff(now, self.changed_at[i]) >= self.debounce_ms:
+                self.states[i] = Keypad.DOWN
+                self.pressed_at[i] = now
+                self.next_repeat[i] = ticks_add(now, self.repeat_delay_ms)
+                self.long_pending[i] = 1 if key in self.long_press_keys else 0
+                self.push(key)
+        elif state == Keypad.DOWN:
+            if not down:
+                self.states[i] = Keypad.RELEASING
+                self.changed_at[i] = now
+                return
+
+            if key in self.repeat_keys and ticks_diff(now, self.next_repeat[i]) >= 0:
+                self.next_repeat[i] = ticks_add(now, self.repeat_rate_ms)
+                self.push(Key.REPEAT | key)
+            if (
+                self.long_pending[i]
+                and ticks_diff(now, self.pressed_at[i]) >= self.long_press_ms
+            ):
+                self.long_pending[i] = 0
+                self.push(Key.LONG_PRESS | key)
+        elif state == Keypad.RELEASING:
+            if down:
+                # just a bounce, the key is still held
+                self.states[i] = Keypad.DOWN
+            elif ticks_diff(now, self.changed_at[i]) >= self.debounce_ms:
+                self.states[i] = Keypad.UP
+
+    def poll(self):
+        """Samples every key once and moves its debounce state along"""
+        self.scanning = True
+        now = ticks_ms()
+        for rowpin in self.rows:
+            rowpin.low()
+
+        any_active = False
         for row in range(len(self.rows)):
             self.rows[row].high()
             for col in range(len(self.cols)):
-                if self.check_cell_db(col):
-                    self.wait_up(col)
-                    self.rows[row].low()
-                    return Interface.KEYPAD_LAYOUT[row][col]
+                i = row * len(self.cols) + col
+                self.update_key(
+                    i, Interface.KEYPAD_LAYOUT[row][col], self.cols[col].value(), now
+                )
+                if self.states[i] != Keypad.UP:
+                    any_active = True
             self.rows[row].low()
-        return None
+
+        if self.use_irq:
+            for rowpin in self.rows:
+                rowpin.high()
+            self.active = any_active
+        self.scanning = False
+
+    def wait_released(self):
+        """Polls until every key reads released, debounce included"""
+        while True:
+            self.poll()
+            released = True
+            for state in self.states:
+                if state != Keypad.UP:
+                    released = False
+            if released:
+                return
+            idle()
+
+    def read_key(self):
+        if self.active:
+            self.poll()
+        key = self.pop()
+        if key is None:
+            # sleep until the next interrupt, the 1 ms tick at the latest
+            idle()
+        return key
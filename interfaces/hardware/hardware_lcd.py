@@ -22,7 +22,7 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 from machine import Pin
-from utime import sleep_ms, sleep_us
+from utime import sleep_ms, sleep_us, ticks_us, ticks_diff
 
 ROWS = 2
 COLUMNS = 16
@@ -83,10 +83,20 @@ class LcdApi:
         self.cursor_y = 0
         self.implied_newline = False
         self.backlight = True
+
+        # what the controller is known to hold, None if it isn't known, so
+        # write_command can drop commands that wouldn't change anything
+        self.display_ctrl = None
+        self.address = None
+        # the DDRAM column shown leftmost, display shifts move it around
+        self.shift = None
+        self.sent_commands = 0
+        self.elided_commands = 0
+
         self.display_off()
         self.backlight_on()
         self.clear()
-        self.hal_write_command(self.LCD_ENTRY_MODE | self.LCD_ENTRY_INC)
+        self.write_command(self.LCD_ENTRY_MODE | self.LCD_ENTRY_INC)
         self.hide_cursor()
         self.display_on()
 
@@ -94,24 +104,24 @@ class LcdApi:
         """Clears the LCD display and moves the cursor to the top left
         corner.
         """
-        self.hal_write_command(self.LCD_CLR)
-        self.hal_write_command(self.LCD_HOME)
+        self.write_command(self.LCD_CLR)
+        self.write_command(self.LCD_HOME)
         self.cursor_x = 0
         self.cursor_y = 0
 
     def show_cursor(self):
         """Causes the cursor to be made visible."""
-        self.hal_write_command(
+        self.write_command(
             self.LCD_ON_CTRL | self.LCD_ON_DISPLAY | self.LCD_ON_CURSOR
         )
 
     def hide_cursor(self):
         """Causes the cursor to be hidden."""
-        self.hal_write_command(self.LCD_ON_CTRL | self.LCD_ON_DISPLAY)
+        self.write_command(self.LCD_ON_CTRL | self.LCD_ON_DISPLAY)
 
     def blink_cursor_on(self):
         """Turns on the cursor, and makes it blink."""
-        self.hal_write_command(
+        self.write_command(
             self.LCD_ON_CTRL
             | self.LCD_ON_DISPLAY
             | self.LCD_ON_CURSOR
@@ -120,17 +130,17 @@ class LcdApi:
 
     def blink_cursor_off(self):
         """Turns on the cursor, and makes it no blink (i.e. be solid)."""
-        self.hal_write_command(
+        self.write_command(
             self.LCD_ON_CTRL | self.LCD_ON_DISPLAY | self.LCD_ON_CURSOR
         )
 
     def display_on(self):
         """Turns on (i.e. unblanks) the LCD."""
-        self.hal_write_command(self.LCD_ON_CTRL | self.LCD_ON_DISPLAY)
+        self.write_command(self.LCD_ON_CTRL | self.LCD_ON_DISPLAY)
 
     def display_off(self):
         """Turns off (i.e. blanks) the LCD."""
-        self.hal_write_command(self.LCD_ON_CTRL)
+        self.write_command(self.LCD_ON_CTRL)
 
     def backlight_on(self):
         """Turns the backlight on.
@@ -159,7 +169,7 @@ class LcdApi:
             addr += 0x40  # Lines 1 & 3 add 0x40
         if cursor_y & 2:  # Lines 2 & 3 add number of columns
             addr += self.num_columns
-        self.hal_write_command(self.LCD_DDRAM | addr)
+        self.write_command(self.LCD_DDRAM | addr)
 
     def putchar(self, char):
         """Writes the indicated character to the LCD at the current cursor
@@ -173,7 +183,7 @@ class LcdApi:
             else:
                 self.cursor_x = self.num_columns
         else:
-            self.hal_write_data(ord(char))
+            self.write_data(ord(char))
             self.cursor_x += 1
         if self.cursor_x >= self.num_columns:
             self.cursor_x = 0
@@ -191,22 +201,124 @@ class LcdApi:
             self.putchar(char)
 
     def writestr(self, string, row, col):
-        """Write a string at a given position"""
+        """Write a string at a given position. The address is only set once,
+        the LCD increments it after each character, so it only has to be set
+        again when the string wraps onto the next line. string may be a str,
+        bytes or bytearray. col may be past the shown columns, to write off
+        screen for scroll_to, and the string wraps at the end of those
+        num_columns.
+        """
         self.move_to(row, col)
-        self.putstr(string)
+        start = col - col % self.num_columns
+        is_str = isinstance(string, str)
+        for char in string:
+            if is_str:
+                char = ord(char)
+            self.write_data(char)
+            self.cursor_x += 1
+            if self.cursor_x >= start + self.num_columns:
+                self.cursor_x = start
+                self.cursor_y += 1
+                if self.cursor_y >= self.num_lines:
+                    self.cursor_y = 0
+                self.move_to(self.cursor_y, self.cursor_x)
 
     def custom_char(self, location, charmap):
         """Write a character to one of the 8 CGRAM locations, available
         as chr(0) through chr(7).
         """
         location &= 0x7
-        self.hal_write_command(self.LCD_CGRAM | (location << 3))
+        self.write_command(self.LCD_CGRAM | (location << 3))
         self.hal_sleep_us(40)
         for i in range(8):
-            self.hal_write_data(charmap[i])
+            self.write_data(charmap[i])
             self.hal_sleep_us(40)
         self.move_to(self.cursor_y, self.cursor_x)
 
+    def write_command(self, cmd):
+        """Sends cmd, unless the shadowed display control, address counter
+        and display shift show it wouldn't change anything, in which case
+        it is counted in elided_commands instead.
+        """
+        if cmd & self.LCD_DDRAM:
+            if self.address == cmd & 0x7F:
+                self.elided_commands += 1
+                return
+            self.address = cmd & 0x7F
+        elif cmd & self.LCD_CGRAM:
+            # the address counter points into CGRAM until the next move_to
+            self.address = None
+        elif cmd & self.LCD_FUNCTION:
+            pass
+        elif cmd & self.LCD_MOVE:
+            if not cmd & self.LCD_MOVE_DISP:
+                self.address = None
+            elif self.shift is not None:
+                if cmd & self.LCD_MOVE_RIGHT:
+                    self.shift -= 1
+                else:
+                    self.shift += 1
+                self.shift %= self.get_ddram_columns()
+        elif cmd & self.LCD_ON_CTRL:
+            if self.display_ctrl == cmd:
+                self.elided_commands += 1
+                return
+            self.display_ctrl = cmd
+        elif cmd & self.LCD_ENTRY_MODE:
+            pass
+        elif cmd & self.LCD_HOME:
+            if self.address == 0 and self.shift == 0:
+                self.elided_commands += 1
+                return
+            self.address = 0
+            self.shift = 0
+        elif cmd & self.LCD_CLR:
+            self.address = 0
+            self.shift = 0
+
+        self.sent_commands += 1
+        self.hal_write_command(cmd)
+
+    def get_ddram_columns(self):
+        """Returns the DDRAM columns per line, only num_columns are shown"""
+        if self.num_lines == 1:
+            return 80
+        return 40
+
+    def scroll_to(self, column):
+        """Shifts the display so DDRAM column is the leftmost one shown,
+        with the fewest shifts left or right. Text written past the visible
+        columns can be brought in this way. A HOME is only sent when the
+        shift isn't known, as it takes longer than even half the columns'
+        worth of shifts.
+        """
+        if self.shift is None:
+            self.write_command(self.LCD_HOME)
+
+        ddram_columns = self.get_ddram_columns()
+        left = (column - self.shift) % ddram_columns
+        if left <= ddram_columns - left:
+            for i in range(left):
+                self.write_command(self.LCD_MOVE | self.LCD_MOVE_DISP)
+        else:
+            for i in range(ddram_columns - left):
+                self.write_command(
+                    self.LCD_MOVE | self.LCD_MOVE_DISP | self.LCD_MOVE_RIGHT
+                )
+
+    def write_data(self, data):
+        """Writes a byte at the address counter, which then moves on"""
+        self.hal_write_data(data)
+        if self.address is not None:
+            self.address += 1
+            if self.num_lines == 1:
+                if self.address == 0x50:
+                    self.address = 0
+            elif self.address == 0x28:
+                self.address = 0x40
+            elif self.address == 0x68:
+                self.address = 0
+
     def hal_backlight_on(self):
         """Allows the hal layer to turn the backlight on.
         If desired, a derived HAL class will implement this function.
@@ -238,9 +350,73 @@ class LcdApi:
         sleep_us(usecs)
 
 
+class PinBus:
+    """Drives RS and a nibble of the LCD data lines one Pin at a time.
+    Works on any port, this is what GpioLcd uses if it isn't given a bus.
+    """
+
+    def __init__(self, rs_pin, d4_pin, d5_pin, d6_pin, d7_pin):
+        self.rs_pin = rs_pin
+        self.d4_pin = d4_pin
+        self.d5_pin = d5_pin
+        self.d6_pin = d6_pin
+        self.d7_pin = d7_pin
+
+    def write(self, rs, nibble):
+        self.rs_pin.value(rs)
+        self.d7_pin.value(nibble & 0x08)
+        self.d6_pin.value(nibble & 0x04)
+        self.d5_pin.value(nibble & 0x02)
+        self.d4_pin.value(nibble & 0x01)
+
+
+class RegisterBus:
+    """Drives RS and a nibble of the LCD data lines with one write to the
+    RP2040 SIO GPIO_OUT_SET register and one to GPIO_OUT_CLR. Pins are given
+    as GPIO numbers. mem defaults to machine.mem32, anything that takes
+    mem[address] = value works, e.g. a dict standing in for the registers.
+    """
+
+    SIO_BASE = 0xD0000000
+    GPIO_OUT_SET = SIO_BASE + 0x014
+    GPIO_OUT_CLR = SIO_BASE + 0x018
+
+    def __init__(self, rs_gpio, d4_gpio, d5_gpio, d6_gpio, d7_gpio, mem=None):
+        if mem is None:
+            from machine import mem32
+
+            mem = mem32
+        self.mem = mem
+
+        data_gpios = (d4_gpio, d5_gpio, d6_gpio, d7_gpio)
+        self.rs_mask = 1 << rs_gpio
+        self.all_mask = self.rs_mask
+        for gpio in data_gpios:
+            self.all_mask |= 1 << gpio
+
+        # the set mask for every nibble, so a write is one table lookup
+        self.nibble_masks = []
+        for nibble in range(16):
+            mask = 0
+            for bit in range(4):
+                if nibble & (1 << bit):
+                    mask |= 1 << data_gpios[bit]
+            self.nibble_masks.append(mask)
+
+    def write(self, rs, nibble):
+        mask = self.nibble_masks[nibble & 0x0F]
+        if rs:
+            mask |= self.rs_mask
+        self.mem[RegisterBus.GPIO_OUT_SET] = mask
+        self.mem[RegisterBus.GPIO_OUT_CLR] = self.all_mask ^ mask
+
+
 class GpioLcd(LcdApi):
     """Implements a HD44780 character LCD connected via ESP32 GPIO pins."""
 
+    # clear and home take up to 4.1 msec, anything past that is a timeout
+    BUSY_TIMEOUT_US = 5000
+
     def __init__(
         self,
         rs_pin,
@@ -257,6 +433,8 @@ class GpioLcd(LcdApi):
         backlight_pin=None,
         num_lines=2,
         num_columns=16,
+        poll_busy=False,
+        bus=None,
     ):
         """Constructs the GpioLcd object. All of the arguments must be machine.Pin
         objects which describe which pin the given line from the LCD is
@@ -267,13 +445,20 @@ class GpioLcd(LcdApi):
         if you had actually called:
         GpioLcd(rs, enable, d4=D4, d5=D5, d6=D6, d7=D7)
         The enable 8-bit mode, you need pass d0 through d7.
-        The rw pin isn't used by this library, but if you specify it, then
-        it will be set low.
+        The rw pin is only used when poll_busy is set, in which case the
+        busy flag is read back before each write instead of sleeping for the
+        worst case time after it. Otherwise if you specify it, then it will
+        be set low.
+        In 4-bit mode, RS and the data nibble are written through bus, which
+        defaults to a PinBus over the given pins.
         """
         self.rs_pin = rs_pin
         self.enable_pin = enable_pin
         self.rw_pin = rw_pin
         self.backlight_pin = backlight_pin
+        # the busy flag can't be read until the LCD is initialized
+        self.poll_busy = False
+        self.rs = self.LCD_RS_CMD
         self._4bit = True
         if d4_pin and d5_pin and d6_pin and d7_pin:
             self.d0_pin = d0_pin
@@ -297,6 +482,11 @@ class GpioLcd(LcdApi):
             self.d5_pin = d1_pin
             self.d6_pin = d2_pin
             self.d7_pin = d3_pin
+        if bus is None:
+            bus = PinBus(
+                self.rs_pin, self.d4_pin, self.d5_pin, self.d6_pin, self.d7_pin
+            )
+        self.bus = bus
         self.rs_pin.init(Pin.OUT)
         self.rs_pin.value(0)
         if self.rw_pin:
@@ -343,7 +533,8 @@ class GpioLcd(LcdApi):
         LcdApi.__init__(self, num_lines, num_columns)
         if num_lines > 1:
             cmd |= self.LCD_FUNCTION_2LINES
-        self.hal_write_command(cmd)
+        self.write_command(cmd)
+        self.poll_busy = poll_busy and self.rw_pin is not None
 
     def hal_pulse_enable(self):
         """Pulse the enable line high, and then low again."""
@@ -352,7 +543,45 @@ class GpioLcd(LcdApi):
         self.enable_pin.value(1)
         sleep_us(1)  # Enable pulse needs to be > 450 nsec
         self.enable_pin.value(0)
-        sleep_us(100)  # Commands need > 37us to settle
+        if not self.poll_busy:
+            sleep_us(100)  # Commands need > 37us to settle
+
+    def hal_wait_ready(self):
+        """Polls the busy flag until the LCD can take the next write.
+        If it never clears, the LCD can't be read back (e.g. RW isn't
+        really wired up), so this falls back to the fixed delays for good.
+        """
+        data_pins = [self.d4_pin, self.d5_pin, self.d6_pin, self.d7_pin]
+        if not self._4bit:
+            data_pins += [self.d0_pin, self.d1_pin, self.d2_pin, self.d3_pin]
+        for pin in data_pins:
+            pin.init(Pin.IN)
+        self.rs_pin.value(0)
+        self.rw_pin.value(1)
+
+        start = ticks_us()
+        busy = True
+        while busy and ticks_diff(ticks_us(), start) < self.BUSY_TIMEOUT_US:
+            self.enable_pin.value(1)
+            sleep_us(1)
+            busy = self.d7_pin.value()
+            self.enable_pin.value(0)
+            if self._4bit:
+                # the address counter comes out as a second nibble
+                sleep_us(1)
+                self.enable_pin.value(1)
+                sleep_us(1)
+                self.enable_pin.value(0)
+            sleep_us(1)
+
+        self.rw_pin.value(0)
+        for pin in data_pins:
+            pin.init(Pin.OUT)
+
+        if busy:
+            self.poll_busy = False
+            # worst case for whatever command was still running
+            sleep_ms(5)
 
     def hal_write_init_nibble(self, nibble):
         """Writes an initialization nibble to the LCD.
@@ -374,16 +603,20 @@ class GpioLcd(LcdApi):
         """Writes a command to the LCD.
         Data is latched on the falling edge of E.
         """
-        self.rs_pin.value(0)
+        if self.poll_busy:
+            self.hal_wait_ready()
+        self.rs = self.LCD_RS_CMD
         self.hal_write_8bits(cmd)
-        if cmd <= 3:
+        if cmd <= 3 and not self.poll_busy:
             # The home and clear commands require a worst
             # case delay of 4.1 msec
             sleep_ms(5)
 
     def hal_write_data(self, data):
         """Write data to the LCD."""
-        self.rs_pin.value(1)
+        if self.poll_busy:
+            self.hal_wait_ready()
+        self.rs = self.LCD_RS_DATA
         self.hal_write_8bits(data)
 
     def hal_write_8bits(self, value):
@@ -401,9 +634,6 @@ class GpioLcd(LcdApi):
             self.hal_write_4bits(value >> 4)
 
     def hal_write_4bits(self, nibble):
-        """Writes 4 bits of data to the LCD."""
-        self.d7_pin.value(nibble & 0x08)
-        self.d6_pin.value(nibble & 0x04)
-        self.d5_pin.value(nibble & 0x02)
-        self.d4_pin.value(nibble & 0x01)
+        """Writes 4 bits of data to the LCD, along with RS."""
+        self.bus.write(self.rs, nibble & 0x0F)
         self.hal_pulse_enable()
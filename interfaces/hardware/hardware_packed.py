@@ -0,0 +1,254 @@
+class PackedWeights:
+    """Read/write view of the "weights" config packed into a bytearray.
+    It answers the same lookups as the nested dicts ujson would give, e.g.
+    weights["LB"]["plates"]["45"]["using"], but only the buffer and a few
+    small view objects live on the heap.
+
+    Layout, all numbers little endian:
+    header: b"PW", version, number of units
+    per unit: name (2 bytes), bar (u16), collar (u16), number of plates,
+    bars and collars (u8 each), then an entry for each of those, in order
+    entry: value (u16), flags (u8), pairs (u8), label (4 bytes, space padded)
+    """
+
+    MAGIC = b"PW"
+    VERSION = 1
+    HEADER_SIZE = 4
+    UNIT_HEADER_SIZE = 9
+    ENTRY_SIZE = 8
+    LABEL_SIZE = 4
+
+    TABLES = ("plates", "bars", "collars")
+
+    USING = 0x01
+    HAS_PAIRS = 0x02
+
+    def __init__(self, buf):
+        if buf[:2] != PackedWeights.MAGIC or buf[2] != PackedWeights.VERSION:
+            raise ValueError("not packed weights")
+        self.buf = buf
+        # leaf paths written through the views since the last save
+        self.changes = []
+
+        self.units = {}
+        offset = PackedWeights.HEADER_SIZE
+        for i in range(buf[3]):
+            unit = PackedUnit(self, offset)
+            self.units[unit.name] = unit
+            offset = unit.end
+
+    def __getitem__(self, unit):
+        return self.units[unit]
+
+    def __contains__(self, unit):
+        return unit in self.units
+
+    def __iter__(self):
+        return iter(self.units)
+
+    def __len__(self):
+        return len(self.units)
+
+    def keys(self):
+        return self.units.keys()
+
+    def items(self):
+        return self.units.items()
+
+    def changed(self, path):
+        if path not in self.changes:
+            self.changes.append(path)
+
+    def lookup(self, path):
+        value = self
+        for key in path.split("/"):
+            value = value[key]
+        return value
+
+
+class PackedUnit:
+    def __init__(self, weights, offset):
+        self.weights = weights
+        self.offset = offset
+        buf = weights.buf
+        self.name = str(buf[offset : offset + 2], "utf-8")
+
+        entry_offset = offset + PackedWeights.UNIT_HEADER_SIZE
+        self.tables = {}
+        for i in range(len(PackedWeights.TABLES)):
+            table_name = PackedWeights.TABLES[i]
+            table = PackedTable(
+                weights, self.name + "/" + table_name, entry_offset, buf[offset + 6 + i]
+            )
+            self.tables[table_name] = table
+            entry_offset += len(table) * PackedWeights.ENTRY_SIZE
+        self.end = entry_offset
+
+    def __getitem__(self, key):
+        if key == "bar":
+            return get_u16(self.weights.buf, self.offset + 2)
+        if key == "collar":
+            return get_u16(self.weights.buf, self.offset + 4)
+        return self.tables[key]
+
+    def __setitem__(self, key, value):
+        if key == "bar":
+            set_u16(self.weights.buf, self.offset + 2, value)
+        elif key == "collar":
+            set_u16(self.weights.buf, self.offset + 4, value)
+        else:
+            raise KeyError(key)
+        self.weights.changed(self.name + "/" + key)
+
+    def __contains__(self, key):
+        return key in ("bar", "collar") or key in self.tables
+
+    def keys(self):
+        return ["plates", "bars", "bar", "collars", "collar"]
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+
+class PackedTable:
+    def __init__(self, weights, path, offset, count):
+        self.weights = weights
+        self.path = path
+        self.offset = offset
+        labels = []
+        for i in range(count):
+            start = offset + i * PackedWeights.ENTRY_SIZE + 4
+            labels.append(
+                str(weights.buf[start : start + PackedWeights.LABEL_SIZE], "utf-8")
+                .strip()
+            )
+        self.labels = tuple(labels)
+
+    def __getitem__(self, label):
+        if label not in self.labels:
+            raise KeyError(label)
+        i = self.labels.index(label)
+        return PackedEntry(
+            self.weights,
+            self.path + "/" + label,
+            self.offset + i * PackedWeights.ENTRY_SIZE,
+        )
+
+    def __contains__(self, label):
+        return label in self.labels
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def keys(self):
+        return self.labels
+
+    def items(self):
+        return [(label, self[label]) for label in self.labels]
+
+
+class PackedEntry:
+    def __init__(self, weights, path, offset):
+        self.weights = weights
+        self.path = path
+        self.offset = offset
+
+    def __getitem__(self, key):
+        buf = self.weights.buf
+        if key == "value":
+            return get_u16(buf, self.offset)
+        if key == "using":
+            return bool(buf[self.offset + 2] & PackedWeights.USING)
+        if key == "pairs" and buf[self.offset + 2] & PackedWeights.HAS_PAIRS:
+            return buf[self.offset + 3]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        buf = self.weights.buf
+        if key == "value":
+            set_u16(buf, self.offset, value)
+        elif key == "using":
+            if value:
+                buf[self.offset + 2] |= PackedWeights.USING
+            else:
+                buf[self.offset + 2] &= ~PackedWeights.USING
+        elif key == "pairs":
+            buf[self.offset + 2] |= PackedWeights.HAS_PAIRS
+            buf[self.offset + 3] = value
+        else:
+            raise KeyError(key)
+        self.weights.changed(self.path + "/" + key)
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def keys(self):
+        if self.weights.buf[self.offset + 2] & PackedWeights.HAS_PAIRS:
+            return ["using", "value", "pairs"]
+        return ["using", "value"]
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+
+def get_u16(buf, offset):
+    return buf[offset] | (buf[offset + 1] << 8)
+
+
+def set_u16(buf, offset, value):
+    buf[offset] = value & 0xFF
+    buf[offset + 1] = (value >> 8) & 0xFF
+
+
+def pack_weights(weights):
+    """Packs a weights config, as nested dicts or another PackedWeights.
+    Raises ValueError if it doesn't fit the layout.
+    """
+    buf = bytearray(PackedWeights.MAGIC)
+    buf.append(PackedWeights.VERSION)
+    buf.append(len(weights))
+    for unit, unit_config in weights.items():
+        if len(unit) != 2:
+            raise ValueError("unit name must be 2 characters")
+        if unit_config["bar"] > 0xFFFF or unit_config["collar"] > 0xFFFF:
+            raise ValueError("bar or collar doesn't fit: %s" % unit)
+        buf.extend(unit.encode())
+        buf.extend(bytes(4))
+        set_u16(buf, len(buf) - 4, unit_config["bar"])
+        set_u16(buf, len(buf) - 2, unit_config["collar"])
+        for table_name in PackedWeights.TABLES:
+            buf.append(len(unit_config[table_name]))
+
+        for table_name in PackedWeights.TABLES:
+            for label, entry in unit_config[table_name].items():
+                if len(label) > PackedWeights.LABEL_SIZE or entry["value"] > 0xFFFF:
+                    raise ValueError("entry doesn't fit: %s" % label)
+                flags = 0
+                if entry["using"]:
+                    flags |= PackedWeights.USING
+                pairs = entry.get("pairs")
+                if pairs is not None:
+                    flags |= PackedWeights.HAS_PAIRS
+                buf.extend(bytes(2))
+                set_u16(buf, len(buf) - 2, entry["value"])
+                buf.append(flags)
+                buf.append(0 if pairs is None else pairs)
+                buf.extend(
+                    (label + " " * (PackedWeights.LABEL_SIZE - len(label))).encode()
+                )
+    return buf
+
+
+def to_dict(value):
+    """Copies a config value into plain dicts, e.g. for ujson"""
+    if hasattr(value, "items"):
+        return dict([(key, to_dict(child)) for key, child in value.items()])
+    return value
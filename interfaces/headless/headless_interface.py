@@ -0,0 +1,164 @@
+from ..interface import Interface
+from ..default_config import DEFAULT_CONFIG
+
+
+def copy_config(value):
+    if isinstance(value, dict):
+        return dict([(key, copy_config(child)) for key, child in value.items()])
+    return value
+
+
+class HeadlessImplementation:
+    """Runs Interface without any hardware or window, e.g. to drive the real
+    states from a script under CPython. The screen is kept in memory the way
+    the LCD keeps it, 40 columns per line of which 16 are shown, keys come
+    from a queue, and time only moves when the clock is advanced.
+    """
+
+    DDRAM_COLUMNS = 40
+
+    def __init__(self, config=None, key_interval_ms=0, idle_step_ms=1000):
+        """key_interval_ms is how far the clock moves for each key read,
+        idle_step_ms how far it moves when read_key finds no key, so the
+        timeout in Interface.read_key runs out after a few calls.
+        """
+        if config is None:
+            config = DEFAULT_CONFIG
+        self.config = copy_config(config)
+        self.key_interval_ms = key_interval_ms
+        self.idle_step_ms = idle_step_ms
+
+        self.now_us = 0
+        self.keys = []
+        self.keys_start = 0
+
+        self.ddram = [
+            bytearray(b" " * HeadlessImplementation.DDRAM_COLUMNS)
+            for i in range(Interface.DISPLAY_DIMS[0])
+        ]
+        self.shift = 0
+        self.cursor = None
+        self.glyphs = [None] * Interface.GLYPH_SLOTS
+        self.display_power = True
+        self.asleep = False
+
+        # calls that would have gone out to the LCD
+        self.writes = 0
+        self.chars_written = 0
+
+    def config_read(self, key):
+        return self.config[key]
+
+    def config_write(self, key, value):
+        self.config[key] = value
+
+    def config_flush(self):
+        pass
+
+    def write_text(self, text, i, j):
+        row = self.ddram[i]
+        for dx in range(len(text)):
+            row[(j + dx) % HeadlessImplementation.DDRAM_COLUMNS] = ord(text[dx])
+        self.writes += 1
+        self.chars_written += len(text)
+
+    def blink_cursor_at(self, i, j):
+        self.cursor = (i, j)
+        self.writes += 1
+
+    def cursor_off(self):
+        self.cursor = None
+        self.writes += 1
+
+    def clear_display(self):
+        for row in self.ddram:
+            for j in range(len(row)):
+                row[j] = 0x20
+        self.shift = 0
+        self.writes += 1
+
+    def scroll_display(self, column):
+        self.shift = column
+        self.writes += 1
+
+    def upload_glyph(self, slot, charmap):
+        self.glyphs[slot] = bytes(charmap)
+        self.writes += 1
+
+    def display_on(self):
+        self.display_power = True
+
+    def display_off(self):
+        self.display_power = False
+
+    def set_sleep(self):
+        self.asleep = True
+
+    def get_time(self):
+        return self.now_us / 1000000
+
+    def ticks_ms(self):
+        return self.now_us // 1000
+
+    def ticks_us(self):
+        return self.now_us
+
+    def advance(self, ms):
+        self.now_us += ms * 1000
+
+    def press(self, *keys):
+        """Queues keys for read_key, in order"""
+        self.keys.extend(keys)
+
+    def pending_keys(self):
+        return len(self.keys) - self.keys_start
+
+    def read_key(self):
+        if self.keys_start == len(self.keys):
+            self.advance(self.idle_step_ms)
+            return None
+
+        key = self.keys[self.keys_start]
+        self.keys_start += 1
+        if self.keys_start == len(self.keys):
+            self.keys = []
+            self.keys_start = 0
+        self.advance(self.key_interval_ms)
+        return key
+
+    def get_screen(self):
+        """Returns the 2 rows the LCD would show, CGRAM glyphs as chr(slot)"""
+        if not self.display_power:
+            return [" " * Interface.DISPLAY_DIMS[1]] * Interface.DISPLAY_DIMS[0]
+        return [
+            "".join(
+                [
+                    chr(row[(self.shift + j) % HeadlessImplementation.DDRAM_COLUMNS])
+                    for j in range(Interface.DISPLAY_DIMS[1])
+                ]
+            )
+            for row in self.ddram
+        ]
+
+    def get_cursor(self):
+        """Returns where the blinking cursor shows, or None if it doesn't"""
+        if self.cursor is None:
+            return None
+        col = (self.cursor[1] - self.shift) % HeadlessImplementation.DDRAM_COLUMNS
+        if col >= Interface.DISPLAY_DIMS[1]:
+            return None
+        return (self.cursor[0], col)
+
+    def run(self, interface, state):
+        """Runs the main loop until the queued keys run out or the state
+        puts the device to sleep, and returns the state it ends in
+        """
+        while not self.asleep:
+            if state.dirty:
+                state.render()
+                interface.flush()
+                state.dirty = False
+            if self.pending_keys() == 0:
+                break
+            state = state.process_input(interface.read_key())
+        return state
@@ -1,3 +1,6 @@
+import calculations
+
+
 class Key:
     ZERO = 0
     ONE = 1
@@ -16,6 +19,10 @@ class Key:
     PERCENT = 14
     UNIT = 15
     TIMEOUT = -1
+    # or'd with a key when it is held down, see Keypad long_press_keys
+    LONG_PRESS = 0x10
+    # or'd with a key for each auto-repeat, see Keypad repeat_keys
+    REPEAT = 0x20
 
     LABELS = {
         ZERO: "0",
@@ -49,17 +56,73 @@ class Interface:
     ]
 
     DISPLAY_DIMS = (2, 16)
+    # the LCD keeps 40 columns per line, enough for 2 screens side by side,
+    # and can shift between them without rewriting anything
+    PAGES = 2
     KEYPAD_DIMS = (len(KEYPAD_LAYOUT), len(KEYPAD_LAYOUT[0]))
+    GLYPH_SLOTS = 8
 
     def __init__(self, implementation):
         self.display_power = True
         self.implementation = implementation
+        self.weights_version = 0
+        # unit -> PlateProfile, for profiles_version of the weights config
+        self.profiles = {}
+        self.profiles_version = 0
+        self.plate_table = calculations.PlateTable(self)
+
+        # frame holds what the states drew since the last flush, shadow holds
+        # what the display has, so flush only sends the difference. Both
+        # hold every page, one after the other on each row
+        self.frame = [
+            bytearray(b" " * (Interface.DISPLAY_DIMS[1] * Interface.PAGES))
+            for i in range(Interface.DISPLAY_DIMS[0])
+        ]
+        self.shadow = [
+            bytearray(b" " * (Interface.DISPLAY_DIMS[1] * Interface.PAGES))
+            for i in range(Interface.DISPLAY_DIMS[0])
+        ]
+        self.shadow_valid = False
+        self.cursor = None
+        self.shown_cursor = None
+
+        # write_text draws into draw_page, flush shows page. Pages nothing
+        # was drawn into since the last clear are left as they are
+        self.draw_page = 0
+        self.page = 0
+        self.shown_page = 0
+        self.drawn_pages = bytearray(Interface.PAGES)
+        # see draw_when_idle
+        self.idle_draw = None
+
+        # the glyph in each CGRAM slot, and the frame it was last used in.
+        # Slots used in the current frame are never evicted
+        self.glyphs = [None] * Interface.GLYPH_SLOTS
+        self.glyph_frames = [0] * Interface.GLYPH_SLOTS
+        self.frame_count = 0
+        self.pending_glyphs = []
 
     def config_read(self, key):
         return self.implementation.config_read(key)
 
     def config_write(self, key, value):
         self.implementation.config_write(key, value)
+        if key == "weights":
+            self.weights_version += 1
+
+    def get_profile(self, unit):
+        """Returns the PlateProfile of unit, rebuilt after the weights change"""
+        if self.profiles_version != self.weights_version:
+            self.profiles_version = self.weights_version
+            self.profiles = {}
+        if unit not in self.profiles:
+            self.profiles[unit] = calculations.PlateProfile(
+                self.config_read("weights")[unit]
+            )
+        return self.profiles[unit]
+
+    def config_flush(self):
+        self.implementation.config_flush()
 
     def write_text(self, text, i, j):
         if (
@@ -71,17 +134,145 @@ class Interface:
             raise ValueError()
 
         if self.display_power:
-            self.implementation.write_text(text, i, j)
+            row = self.frame[i]
+            start = self.draw_page * Interface.DISPLAY_DIMS[1] + j
+            for dx in range(min(len(text), Interface.DISPLAY_DIMS[1] - j)):
+                row[start + dx] = ord(text[dx])
+            self.drawn_pages[self.draw_page] = 1
+
+    def get_glyph(self, glyph):
+        """Returns the character that shows glyph, a CustomCharacters entry.
+        The glyph is uploaded on the next flush if it isn't in CGRAM yet,
+        replacing the least recently used one, or if every slot is in use
+        by this frame, its fallback is returned instead.
+        """
+        slot = None
+        for i in range(Interface.GLYPH_SLOTS):
+            if self.glyphs[i] is glyph:
+                slot = i
+                break
+
+        if slot is None:
+            for i in range(Interface.GLYPH_SLOTS):
+                if self.glyphs[i] is None:
+                    slot = i
+                    break
+                if self.glyph_frames[i] != self.frame_count and (
+                    slot is None or self.glyph_frames[i] < self.glyph_frames[slot]
+                ):
+                    slot = i
+            if slot is None:
+                return glyph["fallback"]
+
+            # the cells still showing the old glyph change with it, but this
+            # frame doesn't use it, so flush rewrites them anyway
+            self.glyphs[slot] = glyph
+            if slot not in self.pending_glyphs:
+                self.pending_glyphs.append(slot)
+
+        self.glyph_frames[slot] = self.frame_count
+        return chr(slot)
+
+    def forget_glyphs(self):
+        for i in range(Interface.GLYPH_SLOTS):
+            self.glyphs[i] = None
+        self.pending_glyphs = []
+
+    def set_draw_page(self, page):
+        """Makes write_text draw into page, off screen unless it is shown"""
+        self.draw_page = page
+
+    def show_page(self, page):
+        """Shows page once flushed, by shifting the display over to it"""
+        self.page = page
+
+    def draw_when_idle(self, draw):
+        """Has read_key call draw, and flush what it drew, once no key is
+        waiting. For drawing off screen, which no key is waiting on. A new
+        frame drops it, along with the screen it was drawing for.
+        """
+        self.idle_draw = draw
 
     def blink_cursor_at(self, i, j):
-        self.implementation.blink_cursor_at(i, j)
+        self.cursor = (i, j)
 
     def cursor_off(self):
-        self.implementation.cursor_off()
+        self.cursor = None
 
     def clear_display(self):
         self.cursor_off()
-        self.implementation.clear_display()
+        self.frame_count += 1
+        for row in self.frame:
+            for j in range(len(row)):
+                row[j] = 0x20
+        self.draw_page = 0
+        self.page = 0
+        for page in range(Interface.PAGES):
+            self.drawn_pages[page] = 0
+        self.idle_draw = None
+
+    def flush(self):
+        """Sends the cells that changed since the last flush to the display"""
+        if not self.display_power:
+            return
+
+        if not self.shadow_valid:
+            self.implementation.clear_display()
+            for row in self.shadow:
+                for j in range(len(row)):
+                    row[j] = 0x20
+            self.shown_cursor = None
+            self.shown_page = 0
+            self.shadow_valid = True
+
+        for slot in self.pending_glyphs:
+            self.implementation.upload_glyph(slot, self.glyphs[slot]["bytes"])
+        self.pending_glyphs = []
+
+        # fill in the page to show before shifting to it, and the others
+        # after, while they are off screen
+        wrote = self.flush_page(self.page)
+        if self.page != self.shown_page:
+            self.implementation.scroll_display(self.page * Interface.DISPLAY_DIMS[1])
+            self.shown_page = self.page
+        for page in range(Interface.PAGES):
+            if page != self.page and self.drawn_pages[page]:
+                wrote = self.flush_page(page) or wrote
+
+        cursor = self.cursor
+        if cursor is not None:
+            cursor = (cursor[0], self.page * Interface.DISPLAY_DIMS[1] + cursor[1])
+            # writing moves the cursor, so put it back
+            if wrote or cursor != self.shown_cursor:
+                self.implementation.blink_cursor_at(cursor[0], cursor[1])
+        elif self.shown_cursor is not None:
+            self.implementation.cursor_off()
+        self.shown_cursor = cursor
+
+    def flush_page(self, page):
+        wrote = False
+        end = (page + 1) * Interface.DISPLAY_DIMS[1]
+        for i in range(Interface.DISPLAY_DIMS[0]):
+            row = self.frame[i]
+            shadow_row = self.shadow[i]
+            j = page * Interface.DISPLAY_DIMS[1]
+            while j < end:
+                if row[j] == shadow_row[j]:
+                    j += 1
+                    continue
+
+                # a single unchanged cell costs the same to rewrite as the
+                # move_to that skipping it would need, so keep the run going
+                start = j
+                while j < end and (
+                    row[j] != shadow_row[j]
+                    or (j + 1 < end and row[j + 1] != shadow_row[j + 1])
+                ):
+                    shadow_row[j] = row[j]
+                    j += 1
+                self.implementation.write_text(str(row[start:j], "utf-8"), i, start)
+                wrote = True
+        return wrote
 
     def read_key(self, timeout=60):
         end_time = self.implementation.get_time() + timeout
@@ -89,6 +280,16 @@ class Interface:
 
         while key is None and self.implementation.get_time() <= end_time:
             key = self.implementation.read_key()
+            if key is None:
+                # use the time between keys to draw off screen, then to fill
+                # in the plate table
+                if self.idle_draw is not None:
+                    draw = self.idle_draw
+                    self.idle_draw = None
+                    draw()
+                    self.flush()
+                else:
+                    self.plate_table.build_step()
 
         if key is not None:
             return key
@@ -105,8 +306,13 @@ class Interface:
 
     def display_on(self):
         self.display_power = True
+        self.shadow_valid = False
+        # the display is set up again, so assume CGRAM was lost
+        self.forget_glyphs()
         self.implementation.display_on()
 
     def display_off(self):
         self.display_power = False
+        self.shadow_valid = False
+        self.forget_glyphs()
         self.implementation.display_off()
@@ -0,0 +1,214 @@
+import sys
+from array import array
+from utime import ticks_us, ticks_diff
+
+
+class Tracer:
+    """Records calls into Interface and the states in a ring buffer, each as
+    its event, ticks_us when it started, how long it took in us and an
+    argument, e.g. the key read. The buffer is allocated up front and
+    recording a call only writes ints into it, so nothing is allocated per
+    event. Nothing is wrapped until install, so with tracing off the calls
+    cost what they always did.
+    """
+
+    READ_KEY = 0
+    WRITE_TEXT = 1
+    CLEAR_DISPLAY = 2
+    BLINK_CURSOR_AT = 3
+    CONFIG_READ = 4
+    CONFIG_WRITE = 5
+    FLUSH = 6
+    RENDER = 7
+    PROCESS_INPUT = 8
+
+    EVENT_NAMES = (
+        "read_key",
+        "write_text",
+        "clear_display",
+        "blink_cursor_at",
+        "config_read",
+        "config_write",
+        "flush",
+        "render",
+        "process_input",
+    )
+
+    # event, start, duration, argument
+    FIELDS = 4
+    # config keys are recorded as their index in here, anything else as NONE
+    CONFIG_KEYS = ("weights", "prompt", "trace")
+    NONE = 0xFF
+
+    def __init__(self, size):
+        self.size = size
+        self.buf = array("I", bytes(4 * Tracer.FIELDS * size))
+        self.next = 0
+        self.wrapped = False
+        # state classes, recorded as their index in here
+        self.classes = ()
+
+    def record(self, event, start, arg):
+        duration = ticks_diff(ticks_us(), start)
+        i = self.next * Tracer.FIELDS
+        buf = self.buf
+        buf[i] = event
+        buf[i + 1] = start
+        buf[i + 2] = duration
+        buf[i + 3] = arg
+        self.next += 1
+        if self.next == self.size:
+            self.next = 0
+            self.wrapped = True
+
+    def clear(self):
+        self.next = 0
+        self.wrapped = False
+
+    def install(self, interface, states):
+        """Wraps the calls of interface, and render and process_input of every
+        State subclass in the states module
+        """
+        read_key = interface.read_key
+        write_text = interface.write_text
+        clear_display = interface.clear_display
+        blink_cursor_at = interface.blink_cursor_at
+        config_read = interface.config_read
+        config_write = interface.config_write
+        flush = interface.flush
+
+        def traced_read_key(timeout=60):
+            start = ticks_us()
+            key = read_key(timeout)
+            self.record(Tracer.READ_KEY, start, key & 0xFF)
+            return key
+
+        def traced_write_text(text, i, j):
+            start = ticks_us()
+            write_text(text, i, j)
+            self.record(Tracer.WRITE_TEXT, start, (i << 16) | (j << 8) | len(text))
+
+        def traced_clear_display():
+            start = ticks_us()
+            clear_display()
+            self.record(Tracer.CLEAR_DISPLAY, start, 0)
+
+        def traced_blink_cursor_at(i, j):
+            start = ticks_us()
+            blink_cursor_at(i, j)
+            self.record(Tracer.BLINK_CURSOR_AT, start, (i << 8) | j)
+
+        def traced_config_read(key):
+            start = ticks_us()
+            value = config_read(key)
+            self.record(Tracer.CONFIG_READ, start, self.get_config_index(key))
+            return value
+
+        def traced_config_write(key, value):
+            start = ticks_us()
+            config_write(key, value)
+            self.record(Tracer.CONFIG_WRITE, start, self.get_config_index(key))
+
+        def traced_flush():
+            start = ticks_us()
+            flush()
+            self.record(Tracer.FLUSH, start, 0)
+
+        interface.read_key = traced_read_key
+        interface.write_text = traced_write_text
+        interface.clear_display = traced_clear_display
+        interface.blink_cursor_at = traced_blink_cursor_at
+        interface.config_read = traced_config_read
+        interface.config_write = traced_config_write
+        interface.flush = traced_flush
+
+        classes = []
+        for name in dir(states):
+            cls = getattr(states, name)
+            if (
+                isinstance(cls, type)
+                and issubclass(cls, states.State)
+                and cls is not states.State
+            ):
+                classes.append(cls)
+        self.classes = tuple(classes)
+        for i in range(len(self.classes)):
+            self.wrap_state(self.classes[i], i)
+
+    def wrap_state(self, cls, index):
+        render = cls.render
+        process_input = cls.process_input
+
+        # a subclass calling up through super() is already being recorded
+        def traced_render(state):
+            if type(state) is not cls:
+                return render(state)
+            start = ticks_us()
+            render(state)
+            self.record(Tracer.RENDER, start, index)
+
+        def traced_process_input(state, key):
+            if type(state) is not cls:
+                return process_input(state, key)
+            start = ticks_us()
+            result = process_input(state, key)
+            self.record(Tracer.PROCESS_INPUT, start, (index << 8) | (key & 0xFF))
+            return result
+
+        cls.render = traced_render
+        cls.process_input = traced_process_input
+
+    def get_config_index(self, key):
+        for i in range(len(Tracer.CONFIG_KEYS)):
+            if Tracer.CONFIG_KEYS[i] == key:
+                return i
+        return Tracer.NONE
+
+    def describe(self, event, arg):
+        if event == Tracer.READ_KEY:
+            return "key %d" % get_key(arg)
+        if event == Tracer.WRITE_TEXT:
+            return "row %d col %d len %d" % (arg >> 16, (arg >> 8) & 0xFF, arg & 0xFF)
+        if event == Tracer.BLINK_CURSOR_AT:
+            return "row %d col %d" % (arg >> 8, arg & 0xFF)
+        if event == Tracer.CONFIG_READ or event == Tracer.CONFIG_WRITE:
+            if arg < len(Tracer.CONFIG_KEYS):
+                return Tracer.CONFIG_KEYS[arg]
+            return "?"
+        if event == Tracer.RENDER:
+            return self.classes[arg].__name__
+        if event == Tracer.PROCESS_INPUT:
+            return "%s key %d" % (self.classes[arg >> 8].__name__, get_key(arg & 0xFF))
+        return ""
+
+    def dump(self, stream=None):
+        """Writes the events, oldest first, one per line as start us,
+        duration us, event and argument. stream defaults to sys.stdout, which
+        is the USB serial port on the Pico.
+        """
+        if stream is None:
+            stream = sys.stdout
+        start = self.next if self.wrapped else 0
+        count = self.size if self.wrapped else self.next
+        stream.write("start_us duration_us event arg\n")
+        for n in range(count):
+            i = ((start + n) % self.size) * Tracer.FIELDS
+            event = self.buf[i]
+            stream.write(
+                "%d %d %s %s\n"
+                % (
+                    self.buf[i + 1],
+                    self.buf[i + 2],
+                    Tracer.EVENT_NAMES[event],
+                    self.describe(event, self.buf[i + 3]),
+                )
+            )
+
+    def dump_file(self, filename):
+        with open(filename, "w") as f:
+            self.dump(f)
+
+
+def get_key(arg):
+    # keys are recorded as their low byte, which makes Key.TIMEOUT 0xFF
+    return -1 if arg == 0xFF else arg
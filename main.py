@@ -1,5 +1,6 @@
 from interfaces.interface import Interface
 from interfaces.hardware.hardware_interface import HardwareImplementation
+from interfaces.hardware.hardware_lcd import RegisterBus
 import states
 from machine import Pin
 
@@ -16,13 +17,27 @@ interface = Interface(
             "D6": Pin(17, Pin.OUT),
             "D7": Pin(16, Pin.OUT),
         },
+        RegisterBus(21, 19, 18, 17, 16),
     )
 )
+# tracing is only set up when the config asks for it, dump it from the REPL
+# with tracer.dump() or tracer.dump_file(filename)
+trace_events = interface.config_read("trace")["events"]
+if trace_events:
+    from interfaces.tracing import Tracer
+
+    tracer = Tracer(trace_events)
+    tracer.install(interface, states)
+
 states.Menu.menu_init(interface)
 
 curr_state = states.PromptState(interface)
 
 while True:
-    curr_state.render()
+    # keys that change nothing, e.g. scrolling past the end, skip the redraw
+    if curr_state.dirty:
+        curr_state.render()
+        interface.flush()
+        curr_state.dirty = False
     key = interface.read_key()
     curr_state = curr_state.process_input(key)
@@ -0,0 +1,268 @@
+"""Model of an HD44780 LCD controller wired to the simulated GPIOs in 4-bit
+mode. It latches nibbles on the falling edge of E the way the controller
+does, runs the instructions against its own DDRAM, CGRAM and address
+counter, answers busy flag reads, and checks the datasheet timing against
+the virtual clock in utime.
+"""
+
+import machine
+import utime
+
+
+class TimingError(Exception):
+    pass
+
+
+class HD44780:
+    # datasheet execution times at 270 kHz, in microseconds
+    POWER_ON_US = 15000
+    CLEAR_US = 1520
+    COMMAND_US = 37
+    DATA_US = 41
+    # waits the initialization by instruction sequence asks for after the
+    # first and second function set
+    RESET_US = (4100, 100)
+    ENABLE_HIGH_NS = 450
+
+    DDRAM_SIZE = 0x80
+    LINE_COLUMNS = 40
+
+    def __init__(self, rs, e, data, rw=None, strict=True):
+        """Pins are gpio numbers, data being D4 to D7. With strict set, a
+        timing violation raises TimingError, otherwise it is only counted.
+        """
+        self.rs = rs
+        self.e = e
+        self.data = data
+        self.rw = rw
+        self.strict = strict
+
+        self.powered_at = utime.now_us
+        self.busy_until = self.powered_at + HD44780.POWER_ON_US
+        self.e_rose_at = 0
+
+        self.eight_bit = True
+        self.resets = 0
+        self.high_nibble = None
+        self.read_nibbles = None
+
+        self.ddram = bytearray(b" " * HD44780.DDRAM_SIZE)
+        self.cgram = bytearray(64)
+        self.address = 0
+        self.in_cgram = False
+        self.increment = True
+        self.shift_on_write = False
+        self.display = False
+        self.cursor = False
+        self.blink = False
+        self.two_lines = False
+        self.shift = 0
+
+        self.commands = 0
+        self.data_writes = 0
+        self.nibbles = 0
+        self.reads = 0
+        self.ignored = 0
+        self.violations = []
+
+        machine.watch(e, self.on_enable)
+        for i in range(len(data)):
+            machine.connect(data[i], self.make_source(i))
+
+    def make_source(self, bit):
+        def source():
+            if self.read_nibbles is None or not machine.outputs[self.e]:
+                return None
+            return (self.read_nibbles[0] >> bit) & 1
+
+        return source
+
+    def violation(self, message):
+        message = "%d us: %s" % (utime.now_us, message)
+        if self.strict:
+            raise TimingError(message)
+        self.violations.append(message)
+
+    def is_read(self):
+        return self.rw is not None and machine.outputs[self.rw]
+
+    def on_enable(self, gpio, level):
+        if level:
+            self.e_rose_at = utime.now_us
+            if self.is_read():
+                self.start_read()
+            return
+
+        if (utime.now_us - self.e_rose_at) * 1000 < HD44780.ENABLE_HIGH_NS:
+            self.violation("E high for less than %d ns" % HD44780.ENABLE_HIGH_NS)
+
+        if self.is_read():
+            self.read_nibbles.pop(0)
+            if not self.read_nibbles:
+                self.read_nibbles = None
+            return
+
+        nibble = 0
+        for i in range(len(self.data)):
+            nibble |= machine.outputs[self.data[i]] << i
+        self.latch(machine.outputs[self.rs], nibble)
+
+    def start_read(self):
+        if self.read_nibbles is not None:
+            return
+        self.reads += 1
+        if machine.outputs[self.rs]:
+            value = self.read_data()
+        else:
+            busy = utime.now_us < self.busy_until
+            value = (busy << 7) | self.address
+        if self.eight_bit:
+            self.read_nibbles = [value >> 4]
+        else:
+            self.read_nibbles = [value >> 4, value & 0x0F]
+
+    def read_data(self):
+        if self.in_cgram:
+            value = self.cgram[self.address]
+        else:
+            value = self.ddram[self.address]
+        self.move_address(self.increment)
+        return value
+
+    def latch(self, rs, nibble):
+        if utime.now_us < self.powered_at + HD44780.POWER_ON_US:
+            # still resetting itself after power on, nothing gets through
+            self.ignored += 1
+            return
+
+        self.nibbles += 1
+        if utime.now_us < self.busy_until:
+            self.violation(
+                "written %d us before the last instruction finished"
+                % (self.busy_until - utime.now_us)
+            )
+
+        if self.eight_bit:
+            # D0 to D3 aren't wired up, so they read low
+            self.execute(rs, nibble << 4)
+        elif self.high_nibble is None:
+            self.high_nibble = nibble
+        else:
+            value = (self.high_nibble << 4) | nibble
+            self.high_nibble = None
+            self.execute(rs, value)
+
+    def execute(self, rs, value):
+        if rs:
+            self.data_writes += 1
+            self.write_data(value)
+            self.busy_until = utime.now_us + HD44780.DATA_US
+            return
+
+        self.commands += 1
+        duration = HD44780.COMMAND_US
+        if value & 0x80:
+            self.address = value & 0x7F
+            self.in_cgram = False
+        elif value & 0x40:
+            self.address = value & 0x3F
+            self.in_cgram = True
+        elif value & 0x20:
+            if self.eight_bit and self.resets < len(HD44780.RESET_US):
+                duration = HD44780.RESET_US[self.resets]
+                self.resets += 1
+            self.eight_bit = bool(value & 0x10)
+            self.two_lines = bool(value & 0x08)
+        elif value & 0x10:
+            right = bool(value & 0x04)
+            if value & 0x08:
+                self.shift_display(right)
+            else:
+                self.move_address(right)
+        elif value & 0x08:
+            self.display = bool(value & 0x04)
+            self.cursor = bool(value & 0x02)
+            self.blink = bool(value & 0x01)
+        elif value & 0x04:
+            self.increment = bool(value & 0x02)
+            self.shift_on_write = bool(value & 0x01)
+        elif value & 0x02:
+            self.address = 0
+            self.in_cgram = False
+            self.shift = 0
+            duration = HD44780.CLEAR_US
+        elif value & 0x01:
+            for i in range(len(self.ddram)):
+                self.ddram[i] = 0x20
+            self.address = 0
+            self.in_cgram = False
+            self.shift = 0
+            self.increment = True
+            duration = HD44780.CLEAR_US
+        self.busy_until = utime.now_us + duration
+
+    def write_data(self, value):
+        if self.in_cgram:
+            self.cgram[self.address] = value & 0x1F
+        else:
+            self.ddram[self.address] = value
+            if self.shift_on_write:
+                self.shift_display(not self.increment)
+        self.move_address(self.increment)
+
+    def move_address(self, forward):
+        if self.in_cgram:
+            self.address = (self.address + (1 if forward else -1)) % 64
+            return
+
+        if not self.two_lines:
+            self.address = (self.address + (1 if forward else -1)) % 80
+        elif forward:
+            self.address += 1
+            if self.address == 0x28:
+                self.address = 0x40
+            elif self.address == 0x68:
+                self.address = 0
+        elif self.address == 0:
+            self.address = 0x67
+        elif self.address == 0x40:
+            self.address = 0x27
+        else:
+            self.address -= 1
+
+    def shift_display(self, right):
+        # shifting the display right shows the columns to the left
+        self.shift = (self.shift + (-1 if right else 1)) % HD44780.LINE_COLUMNS
+
+    def get_screen(self, num_lines=2, num_columns=16):
+        """Returns the text shown on each line, "" if the display is off.
+        CGRAM characters come out as chr(0) to chr(7).
+        """
+        if not self.display:
+            return [""] * num_lines
+        return [
+            "".join(
+                [
+                    chr(self.ddram[line * 0x40 + (self.shift + col) % 40])
+                    for col in range(num_columns)
+                ]
+            )
+            for line in range(num_lines)
+        ]
+
+    def get_cursor(self, num_columns=16):
+        """Returns the (line, column) the cursor shows at, or None"""
+        if not self.display or not (self.cursor or self.blink) or self.in_cgram:
+            return None
+        col = (self.address % 0x40 - self.shift) % HD44780.LINE_COLUMNS
+        if col >= num_columns:
+            return None
+        return (self.address // 0x40, col)
+
+    def get_glyph(self, char):
+        """Returns the 8 rows of the CGRAM character char"""
+        slot = char & 0x07
+        return bytes(self.cgram[slot * 8 : slot * 8 + 8])
+
+    def get_transactions(self):
+        return self.commands + self.data_writes + self.reads
@@ -0,0 +1,154 @@
+"""Stand-in for MicroPython's machine module. Every GPIO has a level, pins
+driven as outputs set it, and pins read as inputs get it from whatever is
+wired to them (see connect), or from their pull. Edge interrupts fire as
+levels change. mem32 only knows the SIO GPIO_OUT_SET and GPIO_OUT_CLR
+registers, which RegisterBus writes.
+"""
+
+import utime
+
+NUM_GPIOS = 30
+
+SIO_BASE = 0xD0000000
+GPIO_OUT_SET = SIO_BASE + 0x014
+GPIO_OUT_CLR = SIO_BASE + 0x018
+
+# the level each gpio is driven to, and its mode
+outputs = [0] * NUM_GPIOS
+modes = [None] * NUM_GPIOS
+pulls = [None] * NUM_GPIOS
+# gpio -> function returning the level something external drives it to,
+# or None when nothing does
+sources = [None] * NUM_GPIOS
+# gpio -> functions called with (gpio, level) whenever an output changes
+watchers = [[] for i in range(NUM_GPIOS)]
+# gpio -> (handler, trigger, pin, last level) for edge interrupts
+irqs = [None] * NUM_GPIOS
+
+
+class DeepSleep(Exception):
+    pass
+
+
+class Reset(Exception):
+    pass
+
+
+def get_level(gpio):
+    if modes[gpio] == Pin.OUT:
+        return outputs[gpio]
+    if sources[gpio] is not None:
+        level = sources[gpio]()
+        if level is not None:
+            return level
+    return 1 if pulls[gpio] == Pin.PULL_UP else 0
+
+
+def set_output(gpio, level):
+    level = 1 if level else 0
+    if outputs[gpio] == level:
+        return
+    outputs[gpio] = level
+    for watcher in watchers[gpio]:
+        watcher(gpio, level)
+    check_irqs()
+
+
+def connect(gpio, source):
+    """Drives gpio from source() while it is an input"""
+    sources[gpio] = source
+
+
+def watch(gpio, watcher):
+    watchers[gpio].append(watcher)
+
+
+def check_irqs():
+    """Fires the handler of any input whose level changed the right way"""
+    for gpio in range(NUM_GPIOS):
+        irq = irqs[gpio]
+        if irq is None:
+            continue
+        handler, trigger, pin, last = irq
+        level = get_level(gpio)
+        if level == last:
+            continue
+        irqs[gpio] = (handler, trigger, pin, level)
+        if (level and trigger & Pin.IRQ_RISING) or (
+            not level and trigger & Pin.IRQ_FALLING
+        ):
+            handler(pin)
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, gpio, mode=-1, pull=-1):
+        self.gpio = gpio
+        self.init(mode, pull)
+
+    def init(self, mode=-1, pull=-1):
+        if mode != -1:
+            modes[self.gpio] = mode
+        if pull != -1:
+            pulls[self.gpio] = pull
+
+    def value(self, level=None):
+        if level is None:
+            return get_level(self.gpio)
+        set_output(self.gpio, level)
+
+    def high(self):
+        set_output(self.gpio, 1)
+
+    def low(self):
+        set_output(self.gpio, 0)
+
+    def on(self):
+        set_output(self.gpio, 1)
+
+    def off(self):
+        set_output(self.gpio, 0)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+        if handler is None:
+            irqs[self.gpio] = None
+        else:
+            irqs[self.gpio] = (handler, trigger, self, get_level(self.gpio))
+
+
+class Mem32:
+    def __setitem__(self, address, value):
+        if address == GPIO_OUT_SET:
+            level = 1
+        elif address == GPIO_OUT_CLR:
+            level = 0
+        else:
+            raise ValueError("no register at %08x" % address)
+        for gpio in range(NUM_GPIOS):
+            if value & (1 << gpio):
+                set_output(gpio, level)
+
+    def __getitem__(self, address):
+        raise ValueError("no register at %08x" % address)
+
+
+mem32 = Mem32()
+
+
+def idle():
+    # wait for the next interrupt, the 1 ms tick at the latest
+    utime.advance(1000 - utime.now_us % 1000)
+
+
+def deepsleep(ms=None):
+    raise DeepSleep()
+
+
+def reset():
+    raise Reset()
@@ -0,0 +1,246 @@
+"""Runs the firmware on a simulated Pico under CPython: main.py's wiring with
+the real HardwareImplementation, GpioLcd, Keypad and ConfigManager, and the
+machine and utime stand-ins here in place of MicroPython's. An HD44780 model
+sits on the LCD pins and a key matrix on the keypad pins. Keys from the
+command line are pressed and released on the virtual clock, so the keypad
+interrupt and debounce run as they would on the device. For each screen drawn
+this prints the LCD bus time (the clock only moves on sleeps, so this is
+everything the driver waits for), the bytes sent and what the LCD shows.
+
+    python3 simulator/simulate.py 1 3 5 = 9 9 8 CLR
+"""
+
+import os
+import sys
+import tempfile
+
+SIMULATOR_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [SIMULATOR_DIR, os.path.dirname(SIMULATOR_DIR)]
+
+import machine  # noqa: E402
+import utime  # noqa: E402
+from hd44780 import HD44780  # noqa: E402
+from machine import Pin  # noqa: E402
+from interfaces.interface import Interface, Key  # noqa: E402
+from interfaces.hardware.hardware_interface import HardwareImplementation  # noqa
+from interfaces.hardware.hardware_lcd import RegisterBus  # noqa: E402
+import states  # noqa: E402
+
+DEFAULT_KEYS = (
+    "1 3 5 = 9 9 9 8 8 8 % % CLR "
+    "2 2 5 % 8 5 = 9 9 CLR CLR "
+    "SET 2 2 2 2 1 1 1 KG/LB 1 0 0 = CLR P"
+).split()
+
+
+class KeyMatrix:
+    """The keypad wiring: a pressed key joins its row to its column, and the
+    columns are pulled down, so a column reads high while any pressed key on
+    it sits in a row driven high.
+    """
+
+    def __init__(self, row_gpios, col_gpios):
+        self.row_gpios = row_gpios
+        self.pressed = set()
+        for col in range(len(col_gpios)):
+            machine.connect(col_gpios[col], self.make_source(col))
+
+    def make_source(self, col):
+        def source():
+            for row in range(len(self.row_gpios)):
+                if (row, col) in self.pressed and machine.outputs[self.row_gpios[row]]:
+                    return 1
+            return None
+
+        return source
+
+    def find(self, key):
+        for row in range(Interface.KEYPAD_DIMS[0]):
+            for col in range(Interface.KEYPAD_DIMS[1]):
+                if Interface.KEYPAD_LAYOUT[row][col] == key:
+                    return (row, col)
+        raise ValueError("no key %d" % key)
+
+    def press(self, key):
+        self.pressed.add(self.find(key))
+        machine.check_irqs()
+
+    def release(self, key):
+        self.pressed.discard(self.find(key))
+        machine.check_irqs()
+
+
+class Meter:
+    """Bus time and transactions since start"""
+
+    def __init__(self, lcd):
+        self.lcd = lcd
+
+    def start(self):
+        self.at = utime.now_us
+        self.commands = self.lcd.commands
+        self.data_writes = self.lcd.data_writes
+        self.reads = self.lcd.reads
+
+    def stop(self):
+        return (
+            utime.now_us - self.at,
+            self.lcd.commands - self.commands,
+            self.lcd.data_writes - self.data_writes,
+            self.lcd.reads - self.reads,
+        )
+
+
+def parse_key(label):
+    for key, key_label in Key.LABELS.items():
+        if key_label == label:
+            return key
+    raise ValueError("no key labelled %s, try one of %s" % (label, Key.LABELS))
+
+
+def show_row(row):
+    # CGRAM characters don't print, mark them instead
+    return "".join(["#" if ord(c) < Interface.GLYPH_SLOTS else c for c in row])
+
+
+def check_screen(interface, lcd):
+    """Returns what differs between the frame and what the LCD shows"""
+    if not interface.display_power:
+        return []
+    cols = Interface.DISPLAY_DIMS[1]
+    start = interface.page * cols
+    problems = []
+    screen = lcd.get_screen()
+    for i in range(Interface.DISPLAY_DIMS[0]):
+        expected = str(interface.frame[i][start : start + cols], "utf-8")
+        if screen[i] != expected:
+            problems.append("row %d is %r, not %r" % (i, screen[i], expected))
+    cursor = interface.cursor
+    if lcd.get_cursor() != cursor:
+        problems.append("cursor at %s, not %s" % (lcd.get_cursor(), cursor))
+    return problems
+
+
+def report(label, measured, lcd, problems):
+    bus_us, commands, data_writes, reads = measured
+    print(
+        "%-6s %10d %6d %6d %6d %6d"
+        % (label, bus_us, commands + data_writes, commands, data_writes, reads)
+    )
+    for row in lcd.get_screen():
+        print("       |%s|" % show_row(row))
+    for problem in problems:
+        print("       MISMATCH: %s" % problem)
+
+
+class Simulation:
+    """main.py's setup on the simulated pins, booted on creation. The pins
+    and clock are module state in machine and utime, so there can only be
+    one of these per process.
+    """
+
+    ROW_GPIOS = (3, 2, 1, 0)
+    COL_GPIOS = (4, 5, 6, 7)
+
+    def __init__(self, hold_ms=80, gap_ms=250):
+        """Each key is pressed gap_ms after the last one was read, and held
+        for hold_ms
+        """
+        self.hold_ms = hold_ms
+        self.gap_ms = gap_ms
+        self.lcd = HD44780(rs=21, e=20, data=(19, 18, 17, 16))
+        self.matrix = KeyMatrix(Simulation.ROW_GPIOS, Simulation.COL_GPIOS)
+        self.meter = Meter(self.lcd)
+
+        self.meter.start()
+        self.interface = Interface(
+            HardwareImplementation(
+                [Pin(i, Pin.OUT) for i in Simulation.ROW_GPIOS],
+                [Pin(i, Pin.OUT) for i in Simulation.COL_GPIOS],
+                {
+                    "BL": Pin(22, Pin.OUT),
+                    "RS": Pin(21, Pin.OUT),
+                    "EN": Pin(20, Pin.OUT),
+                    "D4": Pin(19, Pin.OUT),
+                    "D5": Pin(18, Pin.OUT),
+                    "D6": Pin(17, Pin.OUT),
+                    "D7": Pin(16, Pin.OUT),
+                },
+                RegisterBus(21, 19, 18, 17, 16),
+            )
+        )
+        states.Menu.menu_init(self.interface)
+        self.state = states.PromptState(self.interface)
+        self.boot = self.meter.stop()
+
+    def read_key(self, key):
+        """Presses key on the keypad, and returns what Interface.read_key
+        makes of it
+        """
+        press_at = utime.now_us + self.gap_ms * 1000
+        utime.schedule(press_at, lambda: self.matrix.press(key))
+        utime.schedule(
+            press_at + self.hold_ms * 1000, lambda: self.matrix.release(key)
+        )
+        return self.interface.read_key()
+
+    def flush(self):
+        """Flushes the interface, and returns the bus use as Meter.stop does"""
+        self.meter.start()
+        self.interface.flush()
+        return self.meter.stop()
+
+
+def run(labels, hold_ms=80, gap_ms=250):
+    print(
+        "%-6s %10s %6s %6s %6s %6s"
+        % ("key", "bus us", "bytes", "cmds", "data", "reads")
+    )
+    sim = Simulation(hold_ms, gap_ms)
+    lcd = sim.lcd
+    report("boot", sim.boot, lcd, [])
+
+    mismatches = 0
+    label = "start"
+    keys = [parse_key(label) for label in labels]
+    total_us = 0
+    try:
+        while True:
+            if sim.state.dirty:
+                # render doesn't touch the bus, flush does
+                sim.state.render()
+                measured = sim.flush()
+                sim.state.dirty = False
+                total_us += measured[0]
+                problems = check_screen(sim.interface, lcd)
+                mismatches += len(problems)
+                report(label, measured, lcd, problems)
+            if not keys:
+                break
+
+            key = keys.pop(0)
+            label = Key.LABELS[key]
+            sim.state = sim.state.process_input(sim.read_key(key))
+    except machine.DeepSleep:
+        print("%-6s deep sleep" % label)
+    except machine.Reset:
+        # a key pressed while going to sleep woke it right up
+        print("%-6s reset" % label)
+
+    print()
+    print("bus time drawing screens: %d us" % total_us)
+    print(
+        "LCD: %d commands, %d data writes, %d nibbles, %d ignored at power on"
+        % (lcd.commands, lcd.data_writes, lcd.nibbles, lcd.ignored)
+    )
+    print("timing violations: %d" % len(lcd.violations))
+    print("screen mismatches: %d" % mismatches)
+    return mismatches == 0 and not lcd.violations
+
+
+if __name__ == "__main__":
+    # the config files go in a scratch directory, not the checkout
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        ok = run(sys.argv[1:] or DEFAULT_KEYS)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,63 @@
+"""Stand-in for MicroPython's utime on a virtual clock. Time only moves when
+something sleeps, or the simulator advances it, so runs are deterministic.
+Events can be scheduled on the clock, e.g. key presses, and run once it
+gets to them.
+"""
+
+# ticks wrap like they do on the RP2040 port
+TICKS_PERIOD = 1 << 30
+
+now_us = 0
+events = []
+scheduled = 0
+
+
+def advance(us):
+    global now_us
+    end = now_us + us
+    while events and events[0][0] <= end:
+        at, order, callback = events.pop(0)
+        now_us = max(now_us, at)
+        callback()
+    now_us = max(now_us, end)
+
+
+def schedule(at_us, callback):
+    """Runs callback once the clock gets to at_us"""
+    global scheduled
+    # events due at the same time run in the order they were scheduled
+    scheduled += 1
+    events.append((at_us, scheduled, callback))
+    events.sort(key=lambda event: event[:2])
+
+
+def sleep(s):
+    advance(int(s * 1000000))
+
+
+def sleep_ms(ms):
+    advance(ms * 1000)
+
+
+def sleep_us(us):
+    advance(us)
+
+
+def ticks_us():
+    return now_us % TICKS_PERIOD
+
+
+def ticks_ms():
+    return now_us // 1000 % TICKS_PERIOD
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) % TICKS_PERIOD
+
+
+def ticks_diff(ticks1, ticks2):
+    return (ticks1 - ticks2 + TICKS_PERIOD // 2) % TICKS_PERIOD - TICKS_PERIOD // 2
+
+
+def time():
+    return now_us // 1000000
@@ -6,6 +6,9 @@ from interfaces.characters import CustomCharacters
 class State:
     def __init__(self, interface):
         self.interface = interface
+        # set when process_input changed what render would draw, the main
+        # loop only renders then
+        self.dirty = True
 
     def process_input(self, key):
         raise NotImplementedError()
@@ -38,6 +41,7 @@ class PromptState(State):
         self.percent_num_digits = 3
         self.unit_state = interface.config_read("prompt")["unit_state"]
         self.pos = "weight"
+        interface.plate_table.select(self.UNIT_STATES[self.unit_state])
 
     def format_first_row(weight, unit_state):
         return "Weight: %-4d(%s)" % (weight, PromptState.UNIT_STATES[unit_state][0])
@@ -87,7 +91,32 @@ class PromptState(State):
             self.UNIT_STATES[self.unit_state],
         )
 
+    def get_ladder(self):
+        self.interface.cursor_off()
+        return LadderState(
+            self.interface,
+            self.curr_val,
+            self.UNIT_STATES[self.unit_state],
+        )
+
+    def get_fields(self):
+        return (
+            self.curr_val,
+            self.num_digits,
+            self.percent,
+            self.percent_num_digits,
+            self.unit_state,
+            self.pos,
+        )
+
     def process_input(self, key):
+        fields = self.get_fields()
+        result = self.update(key)
+        if result is self and self.get_fields() != fields:
+            self.dirty = True
+        return result
+
+    def update(self, key):
         if key == Key.TIMEOUT or key == Key.POWER:
             return self.power_off()
 
@@ -106,7 +135,11 @@ class PromptState(State):
                 curr_prompt_config = self.interface.config_read("prompt")
                 curr_prompt_config["unit_state"] = self.unit_state
                 self.interface.config_write("prompt", curr_prompt_config)
+                self.interface.plate_table.select(self.UNIT_STATES[self.unit_state])
             elif key == Key.PERCENT:
+                # a second press before typing a percentage opens the ladder
+                if self.pos == "percent" and self.percent_num_digits == 0:
+                    return self.get_ladder()
                 self.toggle_pos()
             elif key == Key.CONFIG:
                 return MenuState(self.interface)
@@ -154,7 +187,7 @@ class EditPlateAction(MenuAction):
 
     def get_title(self, interface):
         result = self.title
-        if interface.config_read("weights")[self.unit]["plates"][self.title]["using"]:
+        if self.title in interface.get_profile(self.unit).labels:
             result += " *"
         return result
 
@@ -173,7 +206,7 @@ class EditCollarAction(MenuAction):
 
     def get_title(self, interface):
         result = self.title
-        if interface.config_read("weights")[self.unit]["collars"][self.title]["using"]:
+        if self.title in interface.get_profile(self.unit).collar_labels:
             result += " *"
         return result
 
@@ -200,7 +233,7 @@ class EditBarAction(MenuAction):
 
     def get_title(self, interface):
         result = self.title
-        if interface.config_read("weights")[self.unit]["bars"][self.title]["using"]:
+        if self.title in interface.get_profile(self.unit).bar_labels:
             result += " *"
         return result
 
@@ -272,14 +305,14 @@ class Menu:
         first_row = "1: %s" % (self.submenus[self.row].get_title(interface))
         if self.row > 0:
             first_row += " " * (Interface.DISPLAY_DIMS[1] - len(first_row) - 1)
-            first_row += chr(CustomCharacters.SCROLL_UP_LABEL["index"])
+            first_row += interface.get_glyph(CustomCharacters.SCROLL_UP_LABEL)
 
         second_row = ""
         if self.row + 1 < len(self.submenus):
             second_row = "2: %s" % (self.submenus[self.row + 1].get_title(interface))
             if self.row + 2 < len(self.submenus):
                 second_row += " " * (Interface.DISPLAY_DIMS[1] - len(second_row) - 1)
-                second_row += chr(CustomCharacters.SCROLL_DOWN_LABEL["index"])
+                second_row += interface.get_glyph(CustomCharacters.SCROLL_DOWN_LABEL)
         return [first_row, second_row]
 
     def menu_init(interface):
@@ -303,7 +336,7 @@ class Menu:
 
             for plate in sorted(
                 interface.config_read("weights")[unit]["plates"].keys(),
-                key=lambda x: float(x),
+                key=calculations.get_label_key,
                 reverse=True,
             ):
                 plate_action = EditPlateAction(unit, plate)
@@ -311,7 +344,7 @@ class Menu:
 
             for bar in sorted(
                 interface.config_read("weights")[unit]["bars"].keys(),
-                key=lambda x: float(x),
+                key=calculations.get_label_key,
                 reverse=True,
             ):
                 bar_action = EditBarAction(unit, bar)
@@ -319,7 +352,7 @@ class Menu:
 
             for collar in sorted(
                 interface.config_read("weights")[unit]["collars"].keys(),
-                key=lambda x: float(x),
+                key=calculations.get_label_key,
                 reverse=True,
             ):
                 collar_action = EditCollarAction(unit, collar)
@@ -337,9 +370,24 @@ class MenuState(State):
         elif key == Key.CONFIG:
             return PromptState(self.interface)
         elif Key.is_numeric(key):
+            menu = self.curr_menu
+            row = menu.row
             self.curr_menu = self.curr_menu.navigate(key, self.interface)
             if not isinstance(self.curr_menu, Menu):
                 return self.curr_menu
+            # 1 and 2 may also have run an action that changed a title
+            if (
+                self.curr_menu is not menu
+                or self.curr_menu.row != row
+                or key == Key.ONE
+                or key == Key.TWO
+            ):
+                self.dirty = True
+        elif key == Key.REPEAT | Key.EIGHT or key == Key.REPEAT | Key.NINE:
+            row = self.curr_menu.row
+            self.curr_menu.navigate(key ^ Key.REPEAT, self.interface)
+            if self.curr_menu.row != row:
+                self.dirty = True
         return self
 
     def render(self):
@@ -349,49 +397,17 @@ class MenuState(State):
         self.interface.write_text(rows[1], 1, 0)
 
 
-class ResultState(State):
-    def __init__(self, interface, weight, percent, units):
+class ScrollState(State):
+    def __init__(self, interface):
         super().__init__(interface)
-        weight = round(weight * percent / 100)
-
-        plate_counts, end_weight = calculations.get_plate_counts(
-            weight, units, interface
-        )
-
-        self.display_strings = calculations.get_plate_count_strings(plate_counts)
-        bar_val = interface.config_read("weights")[units[1]]["bar"]
-        bar_str = "%d bar" % (bar_val)
-        self.display_strings.insert(0, bar_str)
-        if end_weight > bar_val * 100:
-            self.display_strings.insert(1, "+")
-
-        collar_val = interface.config_read("weights")[units[1]]["collar"]
-        if collar_val > 0 and end_weight > bar_val * 100:
-            collar_str = "%s collars" % calculations.format_hundredths_weight(collar_val)
-            self.display_strings.append(collar_str)
-
-        self.units = units
+        self.rows = []
         self.scroll_level = 0
+        # which way the last scroll went
+        self.direction = 1
+        self.forget_pages()
 
-        self.aux_weight = None
-        if self.units[0] != self.units[1]:
-            if self.units[1] == "KG":
-                self.aux_weight = round(calculations.kg_to_lb(end_weight) / 100)
-            else:
-                self.aux_weight = round(calculations.lb_to_kg(end_weight) / 100)
-        self.weight = calculations.format_hundredths_weight(end_weight)
-        self.make_rows()
-
-    def make_rows(self):
-        if self.aux_weight is not None:
-            self.rows = [
-                "%s%s/%d%s:"
-                % (self.weight, self.units[1], self.aux_weight, self.units[0])
-            ]
-        else:
-            self.rows = ["%s%s:" % (self.weight, self.units[1])]
-
-        for display_string in self.display_strings:
+    def add_strings(self, display_strings):
+        for display_string in display_strings:
             # if we can fit this in the current row
             if (
                 self.rows[-1] == ""
@@ -406,17 +422,14 @@ class ResultState(State):
                 # we cannot fit it in this row, add a new one
                 self.rows.append(display_string)
 
-        if len(self.display_strings) == 0:
-            self.rows.append("(no plates)")
-
     def process_input(self, key):
         if key == Key.TIMEOUT or key == Key.POWER:
             return self.power_off()
 
-        if key == 8:
+        if key == 8 or key == Key.REPEAT | Key.EIGHT:
             self.scroll_up()
             return self
-        if key == 9:
+        if key == 9 or key == Key.REPEAT | Key.NINE:
             self.scroll_down()
             return self
 
@@ -425,33 +438,257 @@ class ResultState(State):
     def scroll_down(self):
         if self.scroll_level < len(self.rows) - 2:
             self.scroll_level += 1
+            self.direction = 1
+            self.dirty = True
 
     def scroll_up(self):
         if self.scroll_level > 0:
             self.scroll_level -= 1
+            self.direction = -1
+            self.dirty = True
 
     def render(self):
         self.interface.clear_display()
 
-        if self.scroll_level < len(self.rows):
-            self.interface.write_text(self.rows[self.scroll_level], 0, 0)
+        # a level preloaded off screen only needs the display shifted over
+        # to it. Otherwise the shown page is redrawn in place
+        page = self.page
+        if self.scroll_level in self.page_levels:
+            page = self.page_levels.index(self.scroll_level)
+        self.interface.set_draw_page(page)
+        self.render_level(self.scroll_level)
+        self.page_levels[page] = self.scroll_level
+        self.interface.show_page(page)
+        self.page = page
+        self.interface.draw_when_idle(self.preload)
+
+    def preload(self):
+        """Draws the level the next scroll most likely goes to into the other
+        page, off screen, unless it already holds it
+        """
+        # at the end, the only way left is back
+        next_level = self.scroll_level + self.direction
+        if not 0 <= next_level < len(self.rows) - 1:
+            next_level = self.scroll_level - self.direction
+        other_page = (self.page + 1) % Interface.PAGES
+        if (
+            not 0 <= next_level < len(self.rows) - 1
+            or self.page_levels[other_page] == next_level
+        ):
+            return
+        self.interface.set_draw_page(other_page)
+        self.render_level(next_level)
+        self.page_levels[other_page] = next_level
+        self.interface.set_draw_page(self.page)
+
+    def forget_pages(self):
+        """Drops what the pages hold, for after something else is drawn
+        into them
+        """
+        # the page shown, and the scroll level drawn into each page
+        self.page = 0
+        self.page_levels = [None] * Interface.PAGES
+
+    def render_level(self, scroll_level):
+        if scroll_level < len(self.rows):
+            self.interface.write_text(self.rows[scroll_level], 0, 0)
 
             # if we can scroll up, show the scroll button
-            if self.scroll_level > 0:
+            if scroll_level > 0:
                 self.interface.write_text(
-                    chr(CustomCharacters.SCROLL_UP_LABEL["index"]),
+                    self.interface.get_glyph(CustomCharacters.SCROLL_UP_LABEL),
                     0,
                     Interface.DISPLAY_DIMS[1] - 1,
                 )
 
             # display next row
-            if self.scroll_level + 1 < len(self.rows):
-                self.interface.write_text(self.rows[self.scroll_level + 1], 1, 0)
+            if scroll_level + 1 < len(self.rows):
+                self.interface.write_text(self.rows[scroll_level + 1], 1, 0)
 
             # if we can scroll down, show scroll button
-            if self.scroll_level + 2 < len(self.rows):
+            if scroll_level + 2 < len(self.rows):
                 self.interface.write_text(
-                    chr(CustomCharacters.SCROLL_DOWN_LABEL["index"]),
+                    self.interface.get_glyph(CustomCharacters.SCROLL_DOWN_LABEL),
                     1,
                     Interface.DISPLAY_DIMS[1] - 1,
                 )
+
+
+class ResultState(ScrollState):
+    def __init__(self, interface, weight, percent, units):
+        super().__init__(interface)
+        weight = calculations.round_div(weight * percent, 100)
+
+        plate_counts, end_weight = interface.plate_table.get_plate_counts(
+            weight, units
+        )
+
+        profile = interface.get_profile(units[1])
+        self.plate_counts = plate_counts
+        self.profile = profile
+        # PERCENT switches to a picture of one side of the bar
+        self.picture = False
+
+        self.display_strings = calculations.get_plate_count_strings(plate_counts)
+        bar_val = profile.bar
+        bar_str = "%d bar" % (bar_val)
+        self.display_strings.insert(0, bar_str)
+        if end_weight > bar_val * 100:
+            self.display_strings.insert(1, "+")
+
+        collar_val = profile.collar
+        if collar_val > 0 and end_weight > bar_val * 100:
+            collar_str = "%s collars" % calculations.format_hundredths_weight(collar_val)
+            self.display_strings.append(collar_str)
+
+        self.units = units
+
+        self.aux_weight = None
+        if self.units[0] != self.units[1]:
+            if self.units[1] == "KG":
+                self.aux_weight = calculations.round_div(
+                    calculations.kg_to_lb(end_weight), 100
+                )
+            else:
+                self.aux_weight = calculations.round_div(
+                    calculations.lb_to_kg(end_weight), 100
+                )
+        self.weight = calculations.format_hundredths_weight(end_weight)
+
+        # when the target can't be loaded exactly, show the loads either side
+        self.nearest = []
+        target = calculations.to_output_hundredths(weight, units)
+        if end_weight != target:
+            below, above = interface.plate_table.get_index(units[1]).get_nearest(
+                target
+            )
+            if below is not None and above is not None:
+                self.nearest = [
+                    calculations.format_hundredths_weight(below),
+                    calculations.format_hundredths_weight(above),
+                ]
+        self.make_rows()
+
+    def process_input(self, key):
+        if key == Key.PERCENT:
+            self.picture = not self.picture
+            self.dirty = True
+            return self
+        # the picture doesn't scroll, so the list comes back where it was
+        if self.picture and (key & ~Key.REPEAT) in (Key.EIGHT, Key.NINE):
+            return self
+        return super().process_input(key)
+
+    def render(self):
+        if not self.picture:
+            super().render()
+            return
+
+        self.interface.clear_display()
+        weight_str = "%s%s" % (self.weight, self.units[1])
+        self.interface.write_text(weight_str, 0, 0)
+        self.interface.write_text(self.display_strings[0], 1, 0)
+
+        # plates from the middle of the bar out, one per column, as tall as
+        # their share of the biggest plate
+        plates = []
+        for count, label in self.plate_counts:
+            plates += [self.profile.values[self.profile.labels.index(label)]] * count
+
+        col = max(len(weight_str), len(self.display_strings[0])) + 1
+        room = Interface.DISPLAY_DIMS[1] - col
+        if len(plates) > room:
+            # no room for the rest
+            plates = plates[: room - 1]
+            self.interface.write_text("+", 0, Interface.DISPLAY_DIMS[1] - 1)
+
+        for value in plates:
+            level = (
+                CustomCharacters.PLATE_LEVELS * value + self.profile.values[0] - 1
+            ) // self.profile.values[0]
+            self.interface.write_text(
+                self.interface.get_glyph(CustomCharacters.get_plate_glyph(level, True)),
+                0,
+                col,
+            )
+            self.interface.write_text(
+                self.interface.get_glyph(
+                    CustomCharacters.get_plate_glyph(level, False)
+                ),
+                1,
+                col,
+            )
+            col += 1
+
+        # the pages no longer hold the scroll levels
+        self.forget_pages()
+
+    def make_rows(self):
+        if self.aux_weight is not None:
+            self.rows = [
+                "%s%s/%d%s:"
+                % (self.weight, self.units[1], self.aux_weight, self.units[0])
+            ]
+        else:
+            self.rows = ["%s%s:" % (self.weight, self.units[1])]
+
+        self.add_strings(self.display_strings)
+
+        if len(self.display_strings) == 0:
+            self.rows.append("(no plates)")
+
+        if self.nearest:
+            self.rows.append("Near:")
+            self.add_strings(self.nearest)
+
+
+class LadderState(ScrollState):
+    PERCENTS = (50, 60, 70, 80, 90, 100)
+
+    def __init__(self, interface, weight, units):
+        super().__init__(interface)
+        self.weight = weight
+        self.units = units
+
+        rungs = calculations.get_ladder_plate_counts(
+            weight, LadderState.PERCENTS, units, interface
+        )
+
+        self.rows = ["%d%s ladder:" % (weight, units[0])]
+        for i in range(len(rungs)):
+            plate_counts, end_weight = rungs[i]
+            self.rows.append(
+                "%d%%: %s"
+                % (
+                    LadderState.PERCENTS[i],
+                    calculations.format_hundredths_weight(end_weight),
+                )
+            )
+            self.add_strings(calculations.get_plate_count_strings(plate_counts))
+
+    def process_input(self, key):
+        if key == Key.ENTER:
+            return ChangeState(
+                self.interface,
+                calculations.get_ladder_targets(
+                    self.weight, LadderState.PERCENTS, self.units
+                ),
+                self.units,
+            )
+        return super().process_input(key)
+
+
+class ChangeState(ScrollState):
+    def __init__(self, interface, targets, units):
+        super().__init__(interface)
+        self.units = units
+
+        sets = calculations.get_plate_sequence(targets, units, interface)
+
+        self.rows = ["%s changes:" % units[1]]
+        for plate_counts, end_weight, changes in sets:
+            self.rows.append(calculations.format_hundredths_weight(end_weight) + ":")
+            change_strings = calculations.get_plate_change_strings(changes)
+            if not change_strings:
+                change_strings = ["(no change)"]
+            self.add_strings(change_strings)